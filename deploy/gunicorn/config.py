@@ -1,11 +1,25 @@
+import os
+
 bind = "127.0.0.1:8000"
 
-workers = 3
-threads = 2
+# Те же переменные читает settings.py для размера пула соединений с БД
+workers = int(os.getenv("GUNICORN_WORKERS", "3"))
+threads = int(os.getenv("GUNICORN_THREADS", "2"))
+
+# gthread для web_2025.wsgi; для web_2025.asgi - uvicorn_worker.UvicornWorker
+# (вместе с ASYNC_VIEWS=True), потоки gunicorn тогда не используются
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+
+# Приложение выбирается по классу воркера, чтобы они не разошлись:
+# uvicorn обслуживает только ASGI, gthread - только WSGI
+if worker_class.startswith("uvicorn"):
+    wsgi_app = "web_2025.asgi:application"
+else:
+    wsgi_app = "web_2025.wsgi:application"
 
 timeout = 60
 
-accesslog = "/var/log/gunicorn/access.log"
-errorlog = "/var/log/gunicorn/error.log"
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "/var/log/gunicorn/access.log")
+errorlog = os.getenv("GUNICORN_ERRORLOG", "/var/log/gunicorn/error.log")
 
 loglevel = "info"
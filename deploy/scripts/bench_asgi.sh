@@ -0,0 +1,41 @@
+#!/bin/bash
+# Синхронные представления под gthread против асинхронных под uvicorn.
+#
+# gthread: SYNC_WORKERS воркеров x GUNICORN_THREADS потоков (по умолчанию 3 x 2).
+# uvicorn: ASYNC_WORKERS воркеров (по умолчанию столько же) с ASYNC_VIEWS=True.
+# Для сравнения при равной памяти подберите ASYNC_WORKERS так, чтобы RSS
+# в выводе совпадал. Нагрузка - страницы с async-версиями.
+#
+#   ./deploy/scripts/bench_asgi.sh
+#   ASYNC_WORKERS=2 CONCURRENCY=32 ./deploy/scripts/bench_asgi.sh
+
+set -e
+
+SYNC_WORKERS=${SYNC_WORKERS:-3}
+ASYNC_WORKERS=${ASYNC_WORKERS:-$SYNC_WORKERS}
+export GUNICORN_THREADS=${GUNICORN_THREADS:-2}
+
+source "$(dirname "$0")/bench_common.sh"
+
+PATHS="--path / --path /courses/ --path /course/course-1/ --path /student/1/"
+
+
+# ======================
+# Benchmark
+# ======================
+run_mode() {
+    local label=$1 app=$2
+    shift 2
+    start_gunicorn "$app" "$@"
+    env "$@" python manage.py bench_http $PATHS \
+        --url http://127.0.0.1:$PORT \
+        --concurrency "$CONCURRENCY" --duration "$DURATION" --label "$label"
+    echo "  RSS: $(gunicorn_rss_mb) МБ"
+    stop_gunicorn
+}
+
+echo ""
+run_mode "gthread ${SYNC_WORKERS}x${GUNICORN_THREADS}" web_2025.wsgi:application \
+    GUNICORN_WORKERS=$SYNC_WORKERS
+run_mode "uvicorn ${ASYNC_WORKERS}" web_2025.asgi:application \
+    GUNICORN_WORKERS=$ASYNC_WORKERS GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker ASYNC_VIEWS=True
@@ -0,0 +1,74 @@
+#!/bin/bash
+# Общая подготовка для bench_*.sh: PostgreSQL (docker или уже заданный DB_HOST),
+# миграции, тестовые данные и запуск gunicorn в фоне
+
+PORT=${BENCH_PORT:-8011}
+DURATION=${DURATION:-15}
+CONCURRENCY=${CONCURRENCY:-12}
+STUDENTS=${STUDENTS:-10000}
+CONTAINER=fefu_bench_db
+PIDFILE=/tmp/fefu_bench_gunicorn.pid
+
+export DJANGO_SECRET_KEY=${DJANGO_SECRET_KEY:-bench-secret}
+export INSTRUMENTATION_SAMPLE_RATE=0
+
+
+# ======================
+# Postgres
+# ======================
+if [ -z "$DB_HOST" ]; then
+    echo "Postgres (docker)..."
+    docker rm -f $CONTAINER >/dev/null 2>&1 || true
+    docker run -d --name $CONTAINER \
+        -e POSTGRES_USER=bench -e POSTGRES_PASSWORD=bench -e POSTGRES_DB=bench \
+        -p 55432:5432 postgres:15-alpine >/dev/null
+    trap "docker rm -f $CONTAINER >/dev/null" EXIT
+    until docker exec $CONTAINER pg_isready -U bench >/dev/null 2>&1; do
+        sleep 1
+    done
+    export DB_HOST=127.0.0.1 DB_PORT=55432 DB_NAME=bench DB_USER=bench DB_PASSWORD=bench
+fi
+
+
+# ======================
+# Data
+# ======================
+# seed_students <N> - тестовые данные: N студентов, 200 курсов, 3 записи на студента
+seed_students() {
+    DB_POOL=False python manage.py seed_data --students "$1" --courses 200 --enrollments $(($1 * 3))
+}
+
+echo "Migrations and seed..."
+DB_POOL=False python manage.py migrate --verbosity 0
+# BENCH_SEED=0 - скрипт сам вызывает seed_students (например, для нескольких объемов)
+if [ "${BENCH_SEED:-1}" = "1" ]; then
+    seed_students "$STUDENTS"
+fi
+
+
+# ======================
+# Gunicorn
+# ======================
+# start_gunicorn <app> [VAR=value ...] - запускает сервер в фоне с переменными окружения
+start_gunicorn() {
+    local app=$1
+    shift
+    env "$@" gunicorn "$app" \
+        --config deploy/gunicorn/config.py \
+        --bind 127.0.0.1:$PORT \
+        --access-logfile /dev/null --error-logfile - \
+        --pid $PIDFILE --daemon
+    sleep 3
+}
+
+stop_gunicorn() {
+    kill "$(cat $PIDFILE)"
+    sleep 2
+}
+
+# Суммарная резидентная память мастера и воркеров, МБ
+gunicorn_rss_mb() {
+    local master
+    master=$(cat $PIDFILE)
+    ps -o rss= -p "$master" --ppid "$master" | awk '{ sum += $1 } END { printf "%.0f", sum / 1024 }'
+}
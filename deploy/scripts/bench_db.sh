@@ -0,0 +1,37 @@
+#!/bin/bash
+# Сравнение режимов соединений с PostgreSQL под gunicorn (3 воркера x 2 потока):
+#   direct     - новое соединение на каждый запрос (CONN_MAX_AGE=0, без пула)
+#   persistent - постоянные соединения (CONN_MAX_AGE=60)
+#   pool       - пул psycopg
+#
+# По умолчанию поднимает PostgreSQL в docker. Если DB_HOST уже задан,
+# использует существующую базу.
+#
+#   ./deploy/scripts/bench_db.sh
+#   DURATION=30 CONCURRENCY=16 ./deploy/scripts/bench_db.sh
+
+set -e
+
+export GUNICORN_WORKERS=${GUNICORN_WORKERS:-3}
+export GUNICORN_THREADS=${GUNICORN_THREADS:-2}
+
+source "$(dirname "$0")/bench_common.sh"
+
+
+# ======================
+# Benchmark
+# ======================
+run_mode() {
+    local label=$1
+    shift
+    start_gunicorn web_2025.wsgi:application "$@"
+    env "$@" python manage.py bench_http \
+        --url http://127.0.0.1:$PORT \
+        --concurrency "$CONCURRENCY" --duration "$DURATION" --label "$label"
+    stop_gunicorn
+}
+
+echo ""
+run_mode direct DB_POOL=False DB_CONN_MAX_AGE=0
+run_mode persistent DB_POOL=False DB_CONN_MAX_AGE=60
+run_mode pool DB_POOL=True
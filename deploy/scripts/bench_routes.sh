@@ -0,0 +1,57 @@
+#!/bin/bash
+# Все страницы fefu_lab.urls анонимно и под каждой ролью на нескольких объемах
+# данных (SCALES - число студентов, записей на курсы втрое больше).
+#
+# Результаты пишутся в deploy/bench/results-<N>.json и сравниваются с эталоном
+# deploy/bench/baseline-<N>.json: падение rps или рост p95 больше TOLERANCE,
+# рост числа SQL-запросов или новые коды ответа завершают скрипт с ошибкой.
+# UPDATE_BASELINE=1 сохраняет текущие результаты как эталон.
+#
+#   ./deploy/scripts/bench_routes.sh
+#   SCALES="1000 100000" DURATION=3 ./deploy/scripts/bench_routes.sh
+#   UPDATE_BASELINE=1 ./deploy/scripts/bench_routes.sh
+
+set -e
+
+SCALES=${SCALES:-"1000 100000 1000000"}
+TOLERANCE=${TOLERANCE:-0.2}
+DURATION=${DURATION:-5}
+CONCURRENCY=${CONCURRENCY:-4}
+OUT_DIR=${OUT_DIR:-deploy/bench}
+export BENCH_SEED=0
+
+source "$(dirname "$0")/bench_common.sh"
+
+mkdir -p "$OUT_DIR"
+# gunicorn останавливается и при ошибке; ловушка bench_common (docker) сохраняется
+common_trap=$(trap -p EXIT | sed "s/^trap -- '\(.*\)' EXIT$/\1/")
+trap '[ -f $PIDFILE ] && kill "$(cat $PIDFILE)" 2>/dev/null; '"${common_trap:-true}" EXIT
+
+
+# ======================
+# Benchmark
+# ======================
+failed=0
+for scale in $SCALES; do
+    echo ""
+    echo "== $scale студентов =="
+    seed_students "$scale"
+    # Число SQL-запросов приходит в Server-Timing только при полной выборке
+    start_gunicorn web_2025.wsgi:application INSTRUMENTATION_SAMPLE_RATE=1 SERVER_TIMING_PUBLIC=True
+
+    results="$OUT_DIR/results-$scale.json"
+    baseline="$OUT_DIR/baseline-$scale.json"
+    if [ "${UPDATE_BASELINE:-0}" = "1" ]; then
+        python manage.py bench_routes --url http://127.0.0.1:$PORT \
+            --concurrency "$CONCURRENCY" --duration "$DURATION" \
+            --label "$scale" --output "$baseline"
+    elif ! python manage.py bench_routes --url http://127.0.0.1:$PORT \
+            --concurrency "$CONCURRENCY" --duration "$DURATION" \
+            --label "$scale" --output "$results" \
+            --baseline "$baseline" --tolerance "$TOLERANCE"; then
+        failed=1
+    fi
+    stop_gunicorn
+done
+
+exit $failed
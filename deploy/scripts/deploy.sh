@@ -16,10 +16,11 @@ sudo -u postgres createdb -O fefu_user fefu_lab_db 2>/dev/null || true
 # ======================
 echo "Dirs..."
 sudo mkdir -p /run/gunicorn
+sudo mkdir -p /var/log/gunicorn
 sudo mkdir -p /var/www/fefu_lab/staticfiles
 sudo mkdir -p /var/www/fefu_lab/media
 
-sudo chown -R www-data:www-data /run/gunicorn /var/www/fefu_lab
+sudo chown -R www-data:www-data /run/gunicorn /var/log/gunicorn /var/www/fefu_lab
 sudo chmod -R 755 /var/www/fefu_lab
 
 
@@ -41,6 +42,7 @@ sudo ln -sf /etc/nginx/sites-available/fefu_lab.conf /etc/nginx/sites-enabled/
 sudo rm -f /etc/nginx/sites-enabled/default
 
 sudo cp deploy/systemd/gunicorn.service /etc/systemd/system/
+sudo cp deploy/systemd/fefu-cleanup-sessions.service deploy/systemd/fefu-cleanup-sessions.timer /etc/systemd/system/
 
 
 # ======================
@@ -49,6 +51,7 @@ sudo cp deploy/systemd/gunicorn.service /etc/systemd/system/
 echo "Restart..."
 sudo systemctl daemon-reload
 sudo systemctl enable gunicorn
+sudo systemctl enable --now fefu-cleanup-sessions.timer
 sudo systemctl restart gunicorn
 sudo systemctl restart nginx
 
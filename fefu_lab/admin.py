@@ -1,5 +1,80 @@
-from django.contrib import admin
+from datetime import datetime, timedelta
+from functools import reduce
+from operator import or_
+
+from django.contrib import admin, messages
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.contrib.auth.models import User
+from django.db.models import Max, Min, Q, QuerySet
+from django.utils import timezone
+from django.utils.text import smart_split, unescape_string_literal
+
 from .models import Instructor, Student, Course, Enrollment
+from .pagination import EstimatedCountPaginator
+from .services import change_status
+
+
+def _search_terms(search_term):
+    # Разбиение строки поиска как в ModelAdmin.get_search_results: слова и "фразы в кавычках"
+    for term in smart_split(search_term):
+        if term.startswith(('"', "'")) and term[0] == term[-1]:
+            term = unescape_string_literal(term)
+        yield term
+
+
+def _icontains_any(fields, term):
+    return reduce(or_, [Q(**{f'{name}__icontains': term}) for name in fields])
+
+
+def _next_period(start, kind):
+    if kind == 'year':
+        return start.replace(year=start.year + 1)
+    if kind == 'month':
+        return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return start + timedelta(days=1)
+
+
+class DateHierarchyQuerySet(QuerySet):
+    """
+    datetimes() для date_hierarchy без SELECT DISTINCT по всем строкам выборки:
+    каждый год (месяц, день) между первой и последней датой проверяется
+    через exists(), которому по индексу на поле даты хватает одной строки
+    """
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        if kind not in ('year', 'month', 'day'):
+            return super().datetimes(field_name, kind, order, tzinfo)
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds['first'] is None:
+            return []
+        tz = tzinfo or timezone.get_current_timezone()
+        first = timezone.make_naive(bounds['first'], tz)
+        last = timezone.make_naive(bounds['last'], tz)
+
+        start = datetime(first.year, first.month if kind != 'year' else 1, first.day if kind == 'day' else 1)
+        periods = []
+        while start <= last:
+            end = _next_period(start, kind)
+            bounds = {
+                f'{field_name}__gte': timezone.make_aware(start, tz),
+                f'{field_name}__lt': timezone.make_aware(end, tz),
+            }
+            if self.filter(**bounds).exists():
+                periods.append(timezone.make_aware(start, tz))
+            start = end
+        return periods if order == 'ASC' else periods[::-1]
+
+
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class UserAdmin(BaseUserAdmin):
+    # Пользователей столько же, сколько студентов: автодополнение поля user
+    # и список пользователей не считают COUNT(*) по всей таблице
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
 
 @admin.register(Student)
 class StudentAdmin(admin.ModelAdmin):
@@ -7,7 +82,15 @@ class StudentAdmin(admin.ModelAdmin):
     list_filter = ['is_active', 'role', 'faculty', 'created_at']
     search_fields = ['user__first_name', 'user__last_name', 'user__email', 'phone']
     list_per_page = 20
+    list_select_related = ['user']
+    autocomplete_fields = ['user']
     readonly_fields = ['created_at', 'updated_at']
+    # Порядок списка студентов совпадает с индексом auth_user_name_order_idx;
+    # user_id уникален, поэтому админка не добавляет сортировку по -pk
+    ordering = ['user__last_name', 'user__first_name', 'user_id']
+    # COUNT(*) по миллиону строк на каждой странице заменяет оценка планировщика
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Учетная запись', {
@@ -39,10 +122,85 @@ class StudentAdmin(admin.ModelAdmin):
     get_email.short_description = 'Email'
     get_email.admin_order_field = 'user__email'
 
+    def get_queryset(self, request):
+        # str(student) читает пользователя - в том числе в автодополнении поля student
+        return super().get_queryset(request).select_related('user')
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Стандартный поиск объединяет через OR условия по auth_user и students,
+        и PostgreSQL не может применить триграммные индексы ни одной из таблиц.
+        Здесь каждое слово ищется отдельно в пользователях и в телефонах,
+        а результаты объединяются UNION
+        """
+        user_fields = [name.split('__', 1)[1] for name in self.search_fields if name.startswith('user__')]
+        own_fields = [name for name in self.search_fields if not name.startswith('user__')]
+        for term in _search_terms(search_term):
+            # user_id студента уникален, поэтому обе части отдают id пользователя
+            # и каждая читает одну таблицу по своему индексу
+            users = User.objects.filter(_icontains_any(user_fields, term))
+            students = Student.objects.filter(_icontains_any(own_fields, term))
+            matches = users.order_by().values('pk').union(students.order_by().values('user_id'))
+            queryset = queryset.filter(user_id__in=matches)
+        return queryset, False
+
+@admin.register(Instructor)
+class InstructorAdmin(admin.ModelAdmin):
+    list_display = ['last_name', 'first_name', 'email', 'specialization', 'user', 'is_active']
+    list_filter = ['is_active']
+    list_select_related = ['user']
+    search_fields = ['last_name', 'first_name', 'email']
+    autocomplete_fields = ['user']
+
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
     list_display = ['title', 'instructor', 'level', 'duration', 'price', 'is_active']
-    list_filter = ['is_active', 'level', 'instructor']
-    search_fields = ['title', 'description']
+    # Фильтр по преподавателю выводил бы всех преподавателей, их ищут через поиск
+    list_filter = ['is_active', 'level']
+    list_select_related = ['instructor']
+    search_fields = ['title', 'description', 'instructor__last_name']
+    autocomplete_fields = ['instructor']
     prepopulated_fields = {'slug': ['title']}
+
+@admin.register(Enrollment)
+class EnrollmentAdmin(admin.ModelAdmin):
+    list_display = ['student', 'course', 'status', 'enrolled_at', 'completed_at']
+    list_filter = ['status']
+    list_select_related = ['student__user', 'course']
+    # Поиск только по курсу: OR с условиями по студенту не использовал бы индексы
+    search_fields = ['=course__slug']
+    search_help_text = 'URL-идентификатор курса, точное совпадение'
+    autocomplete_fields = ['student', 'course']
+    date_hierarchy = 'enrolled_at'
+    readonly_fields = ['enrolled_at']
+    list_per_page = 50
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['complete', 'cancel', 'reactivate']
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return DateHierarchyQuerySet(model=queryset.model, query=queryset.query, using=queryset._db)
+
+    def _change_status(self, request, queryset, status, verb):
+        changed, no_seats = change_status(queryset, status)
+        self.message_user(request, f'{verb} записей: {changed}', messages.SUCCESS)
+        if no_seats:
+            self.message_user(
+                request,
+                f'Не возвращено из-за мест или неактивного курса: {no_seats}',
+                messages.WARNING
+            )
+
+    @admin.action(description='Завершить выбранные записи', permissions=['change'])
+    def complete(self, request, queryset):
+        self._change_status(request, queryset, 'COMPLETED', 'Завершено')
+
+    @admin.action(description='Отменить выбранные записи', permissions=['change'])
+    def cancel(self, request, queryset):
+        self._change_status(request, queryset, 'CANCELLED', 'Отменено')
+
+    @admin.action(description='Вернуть выбранные записи в активные', permissions=['change'])
+    def reactivate(self, request, queryset):
+        self._change_status(request, queryset, 'ACTIVE', 'Возвращено в активные')
 # Register your models here.
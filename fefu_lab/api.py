@@ -0,0 +1,174 @@
+"""
+JSON API каталога только для чтения: курсы, преподаватели и свободные места.
+
+Ответ целиком (байты JSON) кэшируется под версией 'catalog', которую сбрасывают
+изменения Course, Instructor и Enrollment. Повторный запрос той же страницы
+отдается из кэша без обращения к ORM. ETag - хеш самого ответа, поэтому он
+одинаков во всех процессах и не меняется, когда ответ пересчитан заново.
+Состав полей задается параметром ?fields=a,b, страницы - курсором ?cursor=
+и размером ?limit=
+"""
+import hashlib
+from decimal import Decimal
+
+import orjson
+from django.conf import settings
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Concat, Greatest, NullIf, Trim
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views import View
+
+from .caching import get_or_compute, versioned_key
+from .models import Course, Instructor
+from .pagination import KeysetPaginationMixin
+
+
+def _default(value):
+    # Цена хранится в Decimal: отдаем строкой, чтобы не терять точность
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError
+
+
+def dump_json(data):
+    return orjson.dumps(data, default=_default)
+
+
+class CatalogApiView(KeysetPaginationMixin, View):
+    """
+    Базовое представление API. fields - поля ответа: имя -> выражение ORM
+    или None для одноименного поля модели; default_fields - поля без ?fields=.
+    many = False - ответ из одного объекта по slug из URL
+    """
+    http_method_names = ['get', 'head', 'options']
+    page_kwarg = 'cursor'
+    fields = {}
+    default_fields = None
+    many = True
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def get_params(self):
+        """
+        Проверенные параметры запроса; только из них строится ключ кэша,
+        поэтому посторонние параметры не плодят записи в кэше
+        """
+        requested = self.request.GET.get('fields')
+        names = requested.split(',') if requested else list(self.default_fields or self.fields)
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValueError(f'Неизвестные поля: {", ".join(unknown)}')
+        if not self.many:
+            return {'fields': names}
+
+        try:
+            limit = int(self.request.GET.get('limit', settings.CATALOG_API_PAGE_SIZE))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= settings.CATALOG_API_MAX_PAGE_SIZE:
+            raise ValueError(f'limit: от 1 до {settings.CATALOG_API_MAX_PAGE_SIZE}')
+        return {'fields': names, 'limit': limit, 'cursor': self.request.GET.get(self.page_kwarg, '')}
+
+    def get(self, request, *args, **kwargs):
+        try:
+            params = self.get_params()
+        except ValueError as error:
+            return HttpResponse(dump_json({'error': str(error)}), status=400, content_type='application/json')
+
+        digest = hashlib.md5(dump_json([request.resolver_match.view_name, kwargs, params])).hexdigest()
+        key = versioned_key('catalog', f'api:{digest}')
+        body = get_or_compute(key, lambda: dump_json(self.get_data(params)), settings.CATALOG_API_CACHE_TIMEOUT)
+        etag = quote_etag(hashlib.md5(body).hexdigest())
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return response
+
+        response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        return response
+
+    def select(self, queryset, names, extra=()):
+        """
+        values() с запрошенными полями и служебными extra (поля курсора)
+        """
+        plain = [name for name in [*names, *extra] if self.fields.get(name) is None]
+        expressions = {name: self.fields[name] for name in names if self.fields[name] is not None}
+        return queryset.values(*dict.fromkeys(plain), **expressions)
+
+    def get_data(self, params):
+        names = params['fields']
+        if not self.many:
+            row = self.select(self.get_queryset().filter(slug=self.kwargs['slug']), names).first()
+            if row is None:
+                raise Http404('Объект не найден')
+            return {name: row[name] for name in names}
+
+        keyset = [name for name, _ in self._keyset_fields()]
+        queryset = self.select(self.get_queryset(), names, extra=keyset)
+        page_queryset, cursor_state = self._page_queryset(queryset, params['limit'])
+        _, page, rows, _ = self._build_page(list(page_queryset), params['limit'], cursor_state, None)
+        return {
+            'results': [{name: row[name] for name in names} for row in rows],
+            'next': page.next_page_number(),
+            'previous': page.previous_page_number(),
+        }
+
+
+COURSE_FIELDS = {
+    'id': None,
+    'slug': None,
+    'title': None,
+    'description': None,
+    'level': None,
+    'duration': None,
+    'price': None,
+    'instructor_id': None,
+    'instructor_name': NullIf(
+        Trim(Concat('instructor__first_name', Value(' '), 'instructor__last_name')),
+        Value('')
+    ),
+    'max_students': None,
+    'active_enrollments': None,
+    'seats_left': Greatest(F('max_students') - F('active_enrollments'), Value(0)),
+    'created_at': None,
+    'updated_at': None,
+}
+
+
+class CourseListApiView(CatalogApiView):
+    fields = COURSE_FIELDS
+    default_fields = ['id', 'slug', 'title', 'level', 'duration', 'price', 'instructor_name', 'seats_left']
+    # Тот же порядок, что у CourseListView
+    keyset_ordering = ('-created_at', 'id')
+
+    def get_queryset(self):
+        return Course.objects.filter(is_active=True)
+
+
+class CourseDetailApiView(CourseListApiView):
+    default_fields = None
+    many = False
+
+
+class SeatsApiView(CourseListApiView):
+    """
+    Свободные места на активных курсах - то, что клиент опрашивает чаще всего
+    """
+    default_fields = ['slug', 'max_students', 'active_enrollments', 'seats_left']
+
+
+class InstructorListApiView(CatalogApiView):
+    fields = {
+        'id': None,
+        'first_name': None,
+        'last_name': None,
+        'specialization': None,
+        'degree': None,
+        'courses_count': Count('courses', filter=Q(courses__is_active=True)),
+    }
+
+    def get_queryset(self):
+        return Instructor.objects.filter(is_active=True)
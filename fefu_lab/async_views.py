@@ -0,0 +1,44 @@
+"""
+Асинхронные версии публичных страниц для развертывания под ASGI (uvicorn).
+Подключаются в urls.py при ASYNC_VIEWS = True. Запросы идут через async ORM,
+шаблоны и ETag - те же, что у синхронных представлений в views.py
+"""
+from django.template.response import TemplateResponse
+
+from . import stats, views
+from .conditional import AsyncConditionalGetMixin, AsyncConditionalObjectMixin
+
+
+async def home_page(request):
+    return TemplateResponse(request, 'fefu_lab/home.html', {
+        'title': 'Главная страница',
+        **await stats.aget_home_stats()
+    })
+
+
+class CourseListView(AsyncConditionalGetMixin, views.CourseListView):
+    _page = None
+
+    async def aget_etag(self):
+        state = await self.get_etag_queryset().aaggregate(**self.etag_aggregates)
+        return tuple(state.values())
+
+    def paginate_queryset(self, queryset, page_size):
+        # Страница уже выбрана в aget_response, get_context_data ее только раскладывает
+        return self._page
+
+    async def aget_response(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        self._page = await self.apaginate_queryset(
+            self.object_list,
+            self.get_paginate_by(self.object_list)
+        )
+        return self.render_to_response(self.get_context_data())
+
+
+class CourseDetailView(AsyncConditionalObjectMixin, views.CourseDetailView):
+    pass
+
+
+class StudentDetailView(AsyncConditionalObjectMixin, views.StudentDetailView):
+    pass
@@ -0,0 +1,138 @@
+"""
+Миниатюры аватаров.
+
+Оригинал, загруженный через профиль, не отдается в шаблонах: после коммита
+фоновый поток строит квадратные миниатюры AVATAR_THUMBNAIL_SIZES в WebP
+и JPEG и отмечает профиль флагом avatar_thumbnails_ready. Пока миниатюр нет,
+шаблоны показывают оригинал. Потерянные при перезапуске задачи доделывает
+команда regenerate_avatars
+"""
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger('fefu_lab.avatars')
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+
+
+def thumbnail_name(name, size, fmt):
+    """
+    avatars/photo.png -> avatars/thumbs/photo.png_medium.webp.
+    Имя оригинала сохраняется целиком: photo.png и photo.jpg - разные файлы
+    """
+    directory, filename = posixpath.split(name)
+    return posixpath.join(directory, 'thumbs', f'{filename}_{size}.{fmt}')
+
+
+def generate_thumbnails(name):
+    """
+    Строит все миниатюры для файла из хранилища и возвращает их имена.
+    Не обращается к БД, поэтому подходит для пула процессов
+    """
+    sizes = settings.AVATAR_THUMBNAIL_SIZES
+    largest = max(sizes.values())
+    with default_storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        # JPEG декодируется сразу в уменьшенном масштабе - в разы быстрее и меньше памяти
+        image.draft('RGB', (largest * 2, largest * 2))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    created = []
+    for size, side in sizes.items():
+        thumbnail = ImageOps.fit(image, (side, side), Image.Resampling.LANCZOS)
+        for fmt, (pil_format, options) in FORMATS.items():
+            buffer = BytesIO()
+            thumbnail.save(buffer, pil_format, **options)
+            target = thumbnail_name(name, size, fmt)
+            if default_storage.exists(target):
+                default_storage.delete(target)
+            created.append(default_storage.save(target, ContentFile(buffer.getvalue())))
+    return created
+
+
+def mark_ready(student_ids_by_name):
+    """
+    Отмечает профили с готовыми миниатюрами, если аватар не сменился за время обработки
+    """
+    from .models import Student
+
+    for name, student_id in student_ids_by_name.items():
+        Student.objects.filter(pk=student_id, avatar=name).update(
+            avatar_thumbnails_ready=True,
+            updated_at=timezone.now()
+        )
+
+
+def _process(student_id, name):
+    try:
+        generate_thumbnails(name)
+        mark_ready({name: student_id})
+    except Exception:
+        logger.exception('Не удалось построить миниатюры для %s', name)
+    finally:
+        if settings.AVATAR_THUMBNAILS_ASYNC:
+            connection.close()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.AVATAR_WORKERS,
+            thread_name_prefix='avatars'
+        )
+    return _executor
+
+
+def schedule_thumbnails(student_id, name):
+    """
+    Ставит построение миниатюр в очередь после фиксации транзакции
+    """
+    def submit():
+        if settings.AVATAR_THUMBNAILS_ASYNC:
+            _get_executor().submit(_process, student_id, name)
+        else:
+            _process(student_id, name)
+
+    transaction.on_commit(submit)
+
+
+def discard_thumbnails(name):
+    """
+    Удаляет миниатюры замененного аватара после фиксации транзакции
+    """
+    def delete():
+        for size in settings.AVATAR_THUMBNAIL_SIZES:
+            for fmt in FORMATS:
+                default_storage.delete(thumbnail_name(name, size, fmt))
+
+    transaction.on_commit(delete)
+
+
+def avatar_urls(student, size):
+    """
+    Адреса аватара для шаблона: миниатюры в WebP и JPEG или оригинал, пока их нет
+    """
+    if not student.avatar:
+        return None
+    if not student.avatar_thumbnails_ready:
+        return {'webp': None, 'jpeg': student.avatar.url}
+    name = student.avatar.name
+    return {
+        fmt: default_storage.url(thumbnail_name(name, size, fmt))
+        for fmt in FORMATS
+    }
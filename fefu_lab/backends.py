@@ -1,6 +1,10 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
 from django.db.models import Q
+from django.db.models.functions import Lower
+
+from .throttling import throttle_login
 
 class EmailBackend(ModelBackend):
     """
@@ -11,24 +15,52 @@ class EmailBackend(ModelBackend):
         """
         Аутентификация пользователя по email и паролю
         """
-        try:
-            # Ищем пользователя по email или username
-            user = User.objects.get(
-                Q(email=username) | Q(username=username)
-            )
-        except User.DoesNotExist:
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        
+        # Ищем пользователя по email или username без учета регистра.
+        # Сравнение с Lower(...) попадает в функциональные индексы lower(email)/lower(username),
+        # условие email <> '' совпадает с условием частичного индекса по email
+        login = username.strip().lower()
+
+        # Лимит попыток проверяется до обращения к БД и хеширования пароля.
+        # PermissionDenied прерывает authenticate(), причину view берет из request
+        if request is not None:
+            wait = throttle_login(request, login)
+            if wait:
+                request.login_retry_after = wait
+                raise PermissionDenied
+        candidates = list(
+            User.objects.annotate(
+                email_lower=Lower('email'),
+                username_lower=Lower('username')
+            ).filter(
+                (Q(email_lower=login) & ~Q(email='')) | Q(username_lower=login)
+            )[:2]
+        )
+        if not candidates:
+            # Хешируем пароль впустую, чтобы время ответа не выдавало существование пользователя
+            User().set_password(password)
             return None
         
+        # Совпадение по username приоритетнее совпадения по чужому email
+        candidates.sort(key=lambda u: u.username_lower != login)
+        user = candidates[0]
+        
         # Проверяем пароль
-        if user.check_password(password):
+        if user.check_password(password) and self.user_can_authenticate(user):
             return user
         return None
     
     def get_user(self, user_id):
         """
-        Получение пользователя по ID
+        Получение пользователя по ID вместе с профилем студента,
+        чтобы проверки ролей не делали отдельный запрос
         """
         try:
-            return User.objects.get(pk=user_id)
+            user = User.objects.select_related('student_profile').get(pk=user_id)
         except User.DoesNotExist:
-            return None
\ No newline at end of file
+            return None
+        return user if self.user_can_authenticate(user) else None
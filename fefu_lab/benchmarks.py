@@ -0,0 +1,171 @@
+"""
+Генератор HTTP-нагрузки для команд bench_*: несколько потоков с keep-alive
+соединениями в течение заданного времени, на выходе запросы в секунду
+и перцентили задержки
+"""
+import http.client
+import re
+import threading
+import time
+from collections import Counter
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+QUERIES_RE = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def percentile(values, q):
+    """
+    Перцентиль q (0..100) по отсортированному списку, ближайший ранг
+    """
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+def _queries_from_timing(header):
+    """
+    Число SQL-запросов из Server-Timing (QueryInstrumentationMiddleware)
+    """
+    match = QUERIES_RE.search(header or '')
+    return int(match.group(1)) if match else None
+
+
+def _connect(base):
+    if base.scheme == 'https':
+        return http.client.HTTPSConnection(base.hostname, base.port or 443, timeout=30)
+    return http.client.HTTPConnection(base.hostname, base.port or 80, timeout=30)
+
+
+def fetch_cookies(base_url, path, method='GET', body=None, headers=None):
+    """
+    Один запрос к серверу: статус ответа и выданные cookie (SimpleCookie)
+    """
+    base = urlsplit(base_url)
+    connection = _connect(base)
+    try:
+        connection.request(method, base.path.rstrip('/') + path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        response.read()
+    finally:
+        connection.close()
+    cookies = SimpleCookie()
+    for header in response.headers.get_all('Set-Cookie') or []:
+        cookies.load(header)
+    return response.status, cookies
+
+
+def run_load(base_url, paths, concurrency=8, duration=10.0, warmup=1.0, headers=None,
+             method='GET', body=None, accept=None):
+    """
+    Обходит paths по кругу из concurrency потоков. Первые warmup секунд
+    не учитываются. headers и body могут быть функциями от номера запроса,
+    accept - статусы, которые не считаются ошибкой (по умолчанию < 400).
+    Возвращает словарь с rps, p50/p95/p99 (мс), числом ошибок и статусов
+    """
+    base = urlsplit(base_url)
+    prefix = base.path.rstrip('/')
+    make_headers = headers if callable(headers) else (lambda n, fixed=dict(headers or {}): fixed)
+    make_body = body if callable(body) else (lambda n: body)
+    is_ok = (lambda status: status < 400) if accept is None else (lambda status: status in accept)
+    statuses = Counter()
+    query_counts = []
+    lock = threading.Lock()
+    latencies, errors = [], [0]
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def worker(offset):
+        connection = _connect(base)
+        local, local_errors, local_statuses, i = [], 0, Counter(), offset
+        local_queries = []
+        # Номера запросов потоков не пересекаются: offset, offset + concurrency, ...
+        n = offset
+        try:
+            while True:
+                now = time.perf_counter()
+                if now >= stop_at:
+                    break
+                path = paths[i % len(paths)]
+                i += 1
+                n += concurrency
+                try:
+                    connection.request(method, prefix + path, body=make_body(n), headers=make_headers(n))
+                    response = connection.getresponse()
+                    response.read()
+                    ok = is_ok(response.status)
+                    if now >= measure_from:
+                        local_statuses[response.status] += 1
+                        queries = _queries_from_timing(response.getheader('Server-Timing'))
+                        if queries is not None:
+                            local_queries.append(queries)
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    connection = _connect(base)
+                    ok = False
+                elapsed = time.perf_counter() - now
+                if now >= measure_from:
+                    if ok:
+                        local.append(elapsed)
+                    else:
+                        local_errors += 1
+        finally:
+            connection.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+            statuses.update(local_statuses)
+            query_counts.extend(local_queries)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    to_ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': to_ms(percentile(latencies, 50)),
+        'p95_ms': to_ms(percentile(latencies, 95)),
+        'p99_ms': to_ms(percentile(latencies, 99)),
+        'statuses': dict(statuses),
+        # Среднее по заголовку Server-Timing; None, если сервер запущен
+        # без INSTRUMENTATION_SAMPLE_RATE=1
+        'queries': round(sum(query_counts) / len(query_counts), 2) if query_counts else None,
+    }
+
+
+def compare_results(results, baseline, tolerance=0.2, slack_ms=5.0):
+    """
+    Сравнивает замеры bench_routes с эталоном. Регрессия - падение rps или рост
+    p95 больше чем на tolerance (p95 с запасом slack_ms для быстрых страниц),
+    любой рост числа SQL-запросов, новые ошибки или другие коды ответа.
+    Возвращает список описаний регрессий
+    """
+    regressions = []
+    for key, base in baseline['routes'].items():
+        current = results['routes'].get(key)
+        if current is None:
+            continue
+        if current['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f'{key}: {current["rps"]} запросов/с, в эталоне {base["rps"]}')
+        if base['p95_ms'] is not None and current['p95_ms'] is not None:
+            if current['p95_ms'] > base['p95_ms'] * (1 + tolerance) + slack_ms:
+                regressions.append(f'{key}: p95 {current["p95_ms"]} мс, в эталоне {base["p95_ms"]} мс')
+        if base['queries'] is not None and current['queries'] is not None:
+            if current['queries'] > base['queries']:
+                regressions.append(f'{key}: {current["queries"]} SQL-запросов, в эталоне {base["queries"]}')
+        if current['errors'] > base['errors']:
+            regressions.append(f'{key}: ошибок {current["errors"]}, в эталоне {base["errors"]}')
+        # После сохранения в JSON коды ответа становятся строками
+        current_codes = sorted(map(str, current['statuses']))
+        base_codes = sorted(map(str, base['statuses']))
+        if current_codes != base_codes:
+            regressions.append(f'{key}: коды ответа {current_codes}, в эталоне {base_codes}')
+    return regressions
@@ -0,0 +1,51 @@
+"""
+Массовая вставка строк через COPY PostgreSQL (seed_data, import_enrollments)
+"""
+import io
+
+from django.db import connection
+
+
+def copy_rows(model, rows):
+    """
+    Вставляет строки (словари attname -> значение с одинаковыми ключами)
+    одной командой COPY FROM STDIN. Работает только на PostgreSQL
+    """
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(copy_value(row[column]) for column in columns))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    table = connection.ops.quote_name(model._meta.db_table)
+    column_sql = ', '.join(connection.ops.quote_name(column) for column in columns)
+    sql = f'COPY {table} ({column_sql}) FROM STDIN'
+    # Курсор драйвера бросает свои исключения: wrap_database_errors переводит
+    # их в django.db (IntegrityError и т.д.), как при обычных запросах
+    with connection.cursor() as cursor, connection.wrap_database_errors:
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, 'copy_expert'):
+            raw_cursor.copy_expert(sql, buffer)
+        else:
+            with raw_cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+def copy_value(value):
+    """
+    Значение в текстовом формате COPY
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
@@ -0,0 +1,151 @@
+"""
+Вспомогательные функции для работы с кэшем: версионированные ключи
+и защита от одновременного пересчета (single-flight).
+Функции с префиксом a - варианты для асинхронных представлений
+"""
+import asyncio
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .replicas import read_from_primary
+
+VERSION_KEY = 'fefu:version:{namespace}'
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.05
+
+# Счетчики попаданий в кэш текущего запроса (заполняет QueryInstrumentationMiddleware)
+request_cache_stats = ContextVar('request_cache_stats', default=None)
+
+
+def record_cache_access(hit):
+    stats = request_cache_stats.get()
+    if stats is not None:
+        stats['hits' if hit else 'misses'] += 1
+
+
+def _fresh_version():
+    # Версия на основе времени: если ключ версии вытеснят из кэша,
+    # новое значение не совпадет ни с одной старой записью
+    return int(time.time() * 1000)
+
+
+def get_version(namespace):
+    """
+    Текущая версия пространства имен кэша
+    """
+    key = VERSION_KEY.format(namespace=namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(namespace):
+    key = VERSION_KEY.format(namespace=namespace)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, _fresh_version(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(namespace):
+    """
+    Делает устаревшими все ключи пространства имен
+    """
+    key = VERSION_KEY.format(namespace=namespace)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _fresh_version()
+        cache.set(key, version, None)
+        return version
+
+
+def bump_version_on_commit(namespace):
+    """
+    Сбрасывает версию после фиксации транзакции, чтобы параллельный запрос
+    не закэшировал под новой версией еще не закоммиченные данные
+    """
+    transaction.on_commit(lambda: bump_version(namespace))
+
+
+def versioned_key(namespace, name):
+    return f'fefu:{namespace}:v{get_version(namespace)}:{name}'
+
+
+async def aversioned_key(namespace, name):
+    return f'fefu:{namespace}:v{await aget_version(namespace)}:{name}'
+
+
+def get_or_compute(key, compute, timeout=None):
+    """
+    Возвращает значение из кэша или вычисляет его по default, а не по реплике.
+    Пересчет выполняет только один процесс, остальные ждут его результат
+    """
+    if timeout is None:
+        timeout = settings.STATS_CACHE_TIMEOUT
+
+    value = cache.get(key)
+    record_cache_access(value is not None)
+    if value is not None:
+        return value
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            with read_from_primary():
+                value = compute()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+    # Владелец блокировки не успел - считаем сами, но не ждем бесконечно
+    with read_from_primary():
+        return compute()
+
+
+async def aget_or_compute(key, compute, timeout=None):
+    """
+    Асинхронный get_or_compute: compute - корутинная функция
+    """
+    if timeout is None:
+        timeout = settings.STATS_CACHE_TIMEOUT
+
+    value = await cache.aget(key)
+    record_cache_access(value is not None)
+    if value is not None:
+        return value
+
+    lock_key = f'{key}:lock'
+    if await cache.aadd(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            with read_from_primary():
+                value = await compute()
+            await cache.aset(key, value, timeout)
+        finally:
+            await cache.adelete(lock_key)
+        return value
+
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        value = await cache.aget(key)
+        if value is not None:
+            return value
+
+    with read_from_primary():
+        return await compute()
@@ -0,0 +1,130 @@
+"""
+Conditional GET для публичных страниц: ETag считается по версиям данных
+без рендеринга шаблона, и повторный запрос с If-None-Match получает 304
+"""
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
+
+
+def make_etag(*parts):
+    return hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def viewer_etag_part(request):
+    """
+    Часть ETag, зависящая от пользователя: меню в base.html показывает
+    имя, роль и ссылку на админку
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return 'anon'
+    profile = getattr(user, 'student_profile', None)
+    role = profile.role if profile is not None else ''
+    return f'{user.pk}:{user.first_name}:{role}:{user.is_staff}'
+
+
+class ConditionalGetMixin:
+    """
+    Отвечает 304 Not Modified, если ETag совпал с If-None-Match.
+    get_etag() возвращает значения, от которых зависит страница, и должен быть
+    дешевым: один запрос по индексу или значение из кэша
+    """
+
+    def get_etag(self):
+        raise NotImplementedError
+
+    def _full_etag(self, request, *args, **kwargs):
+        parts = self.get_etag()
+        if parts is None:
+            return None
+        return make_etag(*parts, viewer_etag_part(request))
+
+    def get(self, request, *args, **kwargs):
+        return condition(etag_func=self._full_etag)(super().get)(request, *args, **kwargs)
+
+
+class ConditionalObjectMixin(ConditionalGetMixin):
+    """
+    Для DetailView: объект, загруженный ради ETag, переиспользуется при рендеринге
+    """
+    _etag_object = None
+
+    def get_object_etag(self, obj):
+        raise NotImplementedError
+
+    def get_etag(self):
+        try:
+            self._etag_object = self.get_object()
+        except Http404:
+            return None
+        return self.get_object_etag(self._etag_object)
+
+    def get_object(self, queryset=None):
+        if queryset is None and self._etag_object is not None:
+            return self._etag_object
+        return super().get_object(queryset)
+
+
+class AsyncConditionalGetMixin:
+    """
+    Асинхронный вариант ConditionalGetMixin: aget_etag() и aget_response()
+    вместо get_etag() и обычного get()
+    """
+
+    async def aget_etag(self):
+        raise NotImplementedError
+
+    async def aget_response(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    async def get(self, request, *args, **kwargs):
+        etag = None
+        parts = await self.aget_etag()
+        if parts is not None:
+            # request.user и профиль читаются лениво, обращение к БД только в потоке
+            viewer = await sync_to_async(viewer_etag_part)(request)
+            etag = quote_etag(make_etag(*parts, viewer))
+            response = get_conditional_response(request, etag=etag)
+            if response is not None:
+                return response
+
+        response = await self.aget_response(request, *args, **kwargs)
+        if etag is not None:
+            response.headers.setdefault('ETag', etag)
+        return response
+
+
+class AsyncConditionalObjectMixin(AsyncConditionalGetMixin):
+    """
+    Асинхронный ConditionalObjectMixin для DetailView
+    """
+
+    async def aget_object(self):
+        queryset = self.get_queryset()
+        pk = self.kwargs.get(self.pk_url_kwarg)
+        slug = self.kwargs.get(self.slug_url_kwarg)
+        if pk is not None:
+            queryset = queryset.filter(pk=pk)
+        if slug is not None:
+            queryset = queryset.filter(**{self.get_slug_field(): slug})
+        try:
+            return await queryset.aget()
+        except queryset.model.DoesNotExist:
+            raise Http404('Объект не найден')
+
+    async def aget_etag(self):
+        try:
+            self.object = await self.aget_object()
+        except Http404:
+            return None
+        return self.get_object_etag(self.object)
+
+    async def aget_response(self, request, *args, **kwargs):
+        if getattr(self, 'object', None) is None:
+            self.object = await self.aget_object()
+        return self.render_to_response(self.get_context_data(object=self.object))
@@ -0,0 +1,192 @@
+"""
+Потоковая выгрузка студентов, курсов и записей в CSV/JSONL.
+
+Строки читаются через values_list(...).iterator(chunk_size): на PostgreSQL
+это серверный курсор, в памяти одновременно только одна порция строк,
+связанные student__user и course присоединяются в том же SQL-запросе.
+Используется представлением export_view и командой export_data
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Student, Course, Enrollment
+
+# Набор данных: модель, колонки (заголовок -> поле values_list)
+# и поля, к которым применяются фильтры faculty, status и даты
+DATASETS = {
+    'students': {
+        'model': Student,
+        'columns': {
+            'id': 'pk',
+            'username': 'user__username',
+            'first_name': 'user__first_name',
+            'last_name': 'user__last_name',
+            'email': 'user__email',
+            'faculty': 'faculty',
+            'role': 'role',
+            'is_active': 'is_active',
+            'created_at': 'created_at',
+        },
+        'faculty': 'faculty',
+        'status': None,
+        'date': 'created_at',
+    },
+    'courses': {
+        'model': Course,
+        'columns': {
+            'id': 'pk',
+            'slug': 'slug',
+            'title': 'title',
+            'level': 'level',
+            'instructor': 'instructor__email',
+            'max_students': 'max_students',
+            'active_enrollments': 'active_enrollments',
+            'is_active': 'is_active',
+            'created_at': 'created_at',
+        },
+        'faculty': None,
+        'status': None,
+        'date': 'created_at',
+    },
+    'enrollments': {
+        'model': Enrollment,
+        'columns': {
+            'id': 'pk',
+            'username': 'student__user__username',
+            'first_name': 'student__user__first_name',
+            'last_name': 'student__user__last_name',
+            'faculty': 'student__faculty',
+            'course': 'course__slug',
+            'course_title': 'course__title',
+            'status': 'status',
+            'enrolled_at': 'enrolled_at',
+            'completed_at': 'completed_at',
+        },
+        'faculty': 'student__faculty',
+        'status': 'status',
+        'date': 'enrolled_at',
+    },
+}
+
+# Допустимые значения фильтров
+FILTER_CHOICES = {
+    'faculty': {choice for choice, _ in Student.FACULTY_CHOICES},
+    'status': {choice for choice, _ in Enrollment.STATUS_CHOICES},
+}
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def _day_start(value, name):
+    day = parse_date(value) if value else None
+    if value and day is None:
+        raise ValueError(f'{name}: ожидается дата ГГГГ-ММ-ДД')
+    return timezone.make_aware(datetime.combine(day, time.min)) if day else None
+
+
+def export_queryset(dataset, faculty=None, status=None, date_from=None, date_to=None):
+    """
+    Queryset кортежей для выгрузки. Даты - строки ГГГГ-ММ-ДД включительно.
+    Неизвестный набор данных или неподходящий фильтр - ValueError
+    """
+    spec = DATASETS.get(dataset)
+    if spec is None:
+        raise ValueError(f'Неизвестный набор данных: {dataset}')
+
+    filters = {}
+    for name, value in (('faculty', faculty), ('status', status)):
+        if not value:
+            continue
+        if spec[name] is None:
+            raise ValueError(f'Фильтр {name} не поддерживается для {dataset}')
+        if value not in FILTER_CHOICES[name]:
+            raise ValueError(f'{name}: неизвестное значение {value}')
+        filters[spec[name]] = value
+
+    # Границы суток вместо __date, чтобы работали индексы по дате
+    start = _day_start(date_from, 'from')
+    end = _day_start(date_to, 'to')
+    if start:
+        filters[f'{spec["date"]}__gte'] = start
+    if end:
+        filters[f'{spec["date"]}__lt'] = end + timedelta(days=1)
+
+    return (
+        spec['model'].objects
+        .filter(**filters)
+        .order_by('pk')
+        .values_list(*spec['columns'].values())
+    )
+
+
+def export_lines(dataset, queryset, fmt):
+    """
+    Строки файла выгрузки одна за другой, начиная с заголовка для CSV
+    """
+    header = list(DATASETS[dataset]['columns'])
+    rows = queryset.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    if fmt == 'csv':
+        return _csv_lines(header, rows)
+    return _jsonl_lines(header, rows)
+
+
+def export_chunks(lines, size=64 * 1024):
+    """
+    Склеивает строки в блоки примерно по size символов: сервер пишет
+    в сокет блоками, а не по одной короткой строке
+    """
+    buffer, length = [], 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+async def aexport_chunks(chunks):
+    """
+    Асинхронный итератор над export_chunks для ASGI. Синхронный итератор
+    Django под ASGI собирает целиком в список, здесь же в потоке читается
+    по одному блоку. Поток общий для запроса (thread_sensitive), поэтому
+    серверный курсор остается на том же соединении с БД
+    """
+    next_chunk = sync_to_async(next)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # Обрыв соединения клиентом: закрываем генератор, а с ним и курсор
+        await sync_to_async(chunks.close)()
+
+
+class _Echo:
+    """
+    Псевдофайл для csv.writer: возвращает строку вместо записи в буфер
+    """
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(header, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _jsonl_lines(header, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(header, row)), ensure_ascii=False, default=str) + '\n'
@@ -1,10 +1,19 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 from django.core.exceptions import ValidationError
 from .models import UserProfile
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
+from django.db.models.functions import Lower
 from .models import Student
 
+def users_with_email(email):
+    """
+    Пользователи с данным email без учета регистра (по индексу lower(email))
+    """
+    return User.objects.annotate(email_lower=Lower('email')).filter(email_lower=email.lower())
+
 class FeedbackForm(forms.Form):
     """Форма обратной связи"""
     name = forms.CharField(
@@ -124,7 +133,7 @@ class UserRegistrationForm(UserCreationForm):
         Проверка уникальности email
         """
         email = self.cleaned_data.get('email')
-        if User.objects.filter(email=email).exists():
+        if users_with_email(email).exists():
             raise ValidationError('Пользователь с таким email уже существует')
         return email
 
@@ -139,23 +148,14 @@ class UserRegistrationForm(UserCreationForm):
         
         if commit:
             user.save()
-            # Создаем или обновляем профиль студента
-            profile, created = Student.objects.get_or_create(
-                user=user,
-                defaults={
-                    'faculty': self.cleaned_data['faculty'],
-                    'phone': self.cleaned_data['phone'],
-                    'bio': self.cleaned_data['bio'],
-                    'role': 'STUDENT'
-                }
-            )
-            
-            # Если профиль уже существовал, обновляем его
-            if not created:
-                profile.faculty = self.cleaned_data['faculty']
-                profile.phone = self.cleaned_data['phone']
-                profile.bio = self.cleaned_data['bio']
-                profile.save()
+            # Профиль уже создан сигналом post_save и закэширован на user,
+            # дополняем его без повторного чтения из БД
+            profile = getattr(user, 'student_profile', None) or Student(user=user)
+            profile.faculty = self.cleaned_data['faculty']
+            profile.phone = self.cleaned_data['phone']
+            profile.bio = self.cleaned_data['bio']
+            profile.role = 'STUDENT'
+            profile.save()
         
         return user
 
@@ -185,6 +185,15 @@ class UserProfileForm(forms.ModelForm):
             'email': forms.EmailInput(attrs={'class': 'form-control'}),
         }
 
+    def clean_email(self):
+        """
+        Проверка уникальности email без учета регистра
+        """
+        email = self.cleaned_data.get('email')
+        if email and users_with_email(email).exclude(pk=self.instance.pk).exists():
+            raise ValidationError('Пользователь с таким email уже существует')
+        return email
+
 class StudentProfileForm(forms.ModelForm):
     """
     Форма редактирования профиля студента
@@ -197,4 +206,14 @@ class StudentProfileForm(forms.ModelForm):
             'phone': forms.TextInput(attrs={'class': 'form-control'}),
             'bio': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
             'birth_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
-        }
\ No newline at end of file
+        }
+
+    def clean_avatar(self):
+        """
+        Ограничение размера аватара: миниатюры строятся из оригинала
+        """
+        avatar = self.cleaned_data.get('avatar')
+        limit = settings.AVATAR_MAX_UPLOAD_SIZE
+        if isinstance(avatar, UploadedFile) and avatar.size > limit:
+            raise ValidationError(f'Размер файла не должен превышать {limit // (1024 * 1024)} МБ')
+        return avatar
@@ -0,0 +1,142 @@
+"""
+Измерение стоимости запросов: число SQL-запросов, время в БД, попадания
+в кэш и время рендеринга шаблона по имени URL (course_list, teacher_dashboard...).
+
+Результат пишется структурированной строкой лога, а персоналу (или всем при
+SERVER_TIMING_PUBLIC) отдается и заголовком Server-Timing.
+Одинаковые SQL-шаблоны, повторенные в одном запросе много раз, помечаются
+как вероятный N+1. Замеряется только доля запросов INSTRUMENTATION_SAMPLE_RATE
+"""
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .caching import request_cache_stats
+
+logger = logging.getLogger('fefu_lab.instrumentation')
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+        self.render_started = None
+        self.render_time = None
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: sql приходит с плейсхолдерами, это и есть "форма" запроса
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.shapes[sql] += 1
+
+    def repeated_shapes(self, threshold):
+        return [(sql, count) for sql, count in self.shapes.most_common() if count >= threshold]
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Ставится первым после SecurityMiddleware, чтобы учитывать всю обработку запроса
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= settings.INSTRUMENTATION_SAMPLE_RATE:
+            return self.get_response(request)
+        return self._instrumented(request, self.get_response)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.INSTRUMENTATION_SAMPLE_RATE:
+            return await self.get_response(request)
+        # Соединения с БД у каждого потока свои, а async ORM выполняет запросы
+        # в потоке, вызвавшем async_to_sync. Поэтому замеряемый запрос проводим
+        # через синхронный поток, где и ставится обертка execute_wrapper
+        return await sync_to_async(self._instrumented)(request, async_to_sync(self.get_response))
+
+    def _instrumented(self, request, get_response):
+        metrics = RequestMetrics()
+        request._metrics = metrics
+        cache_stats = {'hits': 0, 'misses': 0}
+        token = request_cache_stats.set(cache_stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(metrics))
+                response = get_response(request)
+        finally:
+            request_cache_stats.reset(token)
+        total = time.perf_counter() - started
+
+        self._report(request, response, metrics, cache_stats, total)
+        return response
+
+    def process_template_response(self, request, response):
+        metrics = getattr(request, '_metrics', None)
+        if metrics is not None:
+            # TemplateResponse рендерится после выхода из view, здесь его начало
+            metrics.render_started = time.perf_counter()
+            response.add_post_render_callback(lambda r: self._render_finished(metrics))
+        return response
+
+    @staticmethod
+    def _render_finished(metrics):
+        metrics.render_time = time.perf_counter() - metrics.render_started
+
+    @staticmethod
+    def _is_staff(request):
+        # request.user ставит AuthenticationMiddleware, которая идет после этой
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
+
+    def _report(self, request, response, metrics, cache_stats, total):
+        match = request.resolver_match
+        url_name = match.view_name if match else None
+        repeated = metrics.repeated_shapes(settings.N_PLUS_ONE_THRESHOLD)
+
+        timings = [
+            f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+            f'cache;desc="hit={cache_stats["hits"]} miss={cache_stats["misses"]}"',
+        ]
+        if metrics.render_time is not None:
+            timings.append(f'render;dur={metrics.render_time * 1000:.1f}')
+        timings.append(f'total;dur={total * 1000:.1f}')
+        if settings.SERVER_TIMING_PUBLIC or self._is_staff(request):
+            response['Server-Timing'] = ', '.join(timings)
+
+        record = {
+            'url_name': url_name,
+            'method': request.method,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 2),
+            'cache_hits': cache_stats['hits'],
+            'cache_misses': cache_stats['misses'],
+            'render_ms': round(metrics.render_time * 1000, 2) if metrics.render_time is not None else None,
+            'total_ms': round(total * 1000, 2),
+        }
+        if repeated:
+            record['n_plus_one'] = [{'sql': sql[:300], 'count': count} for sql, count in repeated]
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
+
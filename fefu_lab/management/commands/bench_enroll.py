@@ -0,0 +1,99 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from fefu_lab.models import Student, Course, Enrollment
+from fefu_lab.services import enroll
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест записи на курс: проверяет отсутствие переполнения и считает записи в секунду'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Количество потоков')
+        parser.add_argument('--students', type=int, default=500, help='Количество желающих записаться')
+        parser.add_argument('--capacity', type=int, default=100, help='Максимум студентов на курсе')
+        parser.add_argument('--keep', action='store_true', help='Не удалять созданные данные')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                'SQLite блокирует всю базу на запись - результаты не отражают PostgreSQL'
+            ))
+
+        prefix = f'bench-enroll-{int(time.time())}'
+        course, students = self._create_data(prefix, options['students'], options['capacity'])
+
+        results = {'ok': 0, 'full': 0, 'errors': 0}
+        lock = threading.Lock()
+        queue = list(students)
+        queue_lock = threading.Lock()
+
+        def worker():
+            try:
+                while True:
+                    with queue_lock:
+                        if not queue:
+                            return
+                        student = queue.pop()
+                    try:
+                        enroll(student, course)
+                        outcome = 'ok'
+                    except ValidationError:
+                        outcome = 'full'
+                    except Exception as exc:
+                        self.stderr.write(f'{type(exc).__name__}: {exc}')
+                        outcome = 'errors'
+                    with lock:
+                        results[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        course.refresh_from_db()
+        actual = Enrollment.objects.filter(course=course, status='ACTIVE').count()
+
+        self.stdout.write(f'Потоков: {options["threads"]}, попыток: {len(students)}, мест: {course.max_students}')
+        self.stdout.write(f'Записано: {results["ok"]}, отказов (нет мест): {results["full"]}, ошибок: {results["errors"]}')
+        self.stdout.write(f'Счетчик курса: {course.active_enrollments}, записей в БД: {actual}')
+        self.stdout.write(f'Время: {elapsed:.3f} с, попыток в секунду: {len(students) / elapsed:.1f}')
+
+        if not options['keep']:
+            self._cleanup(prefix, course)
+
+        if actual > course.max_students or actual != course.active_enrollments or actual != results['ok']:
+            raise CommandError('Обнаружено переполнение курса или рассинхронизация счетчика')
+        self.stdout.write(self.style.SUCCESS('Переполнения нет'))
+
+    def _create_data(self, prefix, count, capacity):
+        course = Course.objects.create(
+            title=prefix,
+            slug=prefix,
+            description='Курс для нагрузочного теста',
+            duration=1,
+            max_students=capacity
+        )
+        # bulk_create не вызывает сигнал создания профиля, профили создаем сами
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}-{i}', email=f'{prefix}-{i}@example.com')
+            for i in range(count)
+        ])
+        if users[0].pk is None:
+            users = list(User.objects.filter(username__startswith=f'{prefix}-'))
+        students = Student.objects.bulk_create([Student(user=user) for user in users])
+        return course, students
+
+    def _cleanup(self, prefix, course):
+        Enrollment.objects.filter(course=course).delete()
+        course.delete()
+        User.objects.filter(username__startswith=f'{prefix}-').delete()
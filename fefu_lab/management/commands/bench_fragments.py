@@ -0,0 +1,71 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from fefu_lab.caching import request_cache_stats
+from fefu_lab.models import Course
+from fefu_lab.views import CourseListView
+
+
+class Command(BaseCommand):
+    help = 'Замер рендеринга страницы курсов без кэша фрагментов, с прогретым кэшем и при изменении одной карточки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Количество рендеров на сценарий')
+
+    def handle(self, *args, **options):
+        courses = list(
+            Course.objects.filter(is_active=True)
+            .select_related('instructor')
+            .order_by('-created_at', 'id')[:CourseListView.paginate_by]
+        )
+        if not courses:
+            raise CommandError('Нет активных курсов, сначала выполните seed_data')
+
+        request = RequestFactory().get('/courses/')
+        request.user = AnonymousUser()
+        iterations = options['iterations']
+
+        def render():
+            render_to_string('fefu_lab/course_list.html', {'courses': courses}, request=request)
+
+        def drop_cards():
+            for course in courses:
+                cache.delete(make_template_fragment_key('course_card', [
+                    course.pk, course.updated_at, course.enrollments_version,
+                    course.instructor.full_name if course.instructor else ''
+                ]))
+
+        def touch_one(i):
+            # Имитация новой записи на курс: меняется только версия одной карточки
+            courses[i % len(courses)].enrollments_version += 1
+
+        self.stdout.write(f'Карточек на странице: {len(courses)}, рендеров на сценарий: {iterations}')
+        self._run('Без кэша', iterations, render, before=lambda i: drop_cards())
+        render()
+        self._run('Прогретый кэш', iterations, render)
+        self._run('Изменена одна карточка', iterations, render, before=touch_one)
+
+    def _run(self, label, iterations, render, before=None):
+        stats = {'hits': 0, 'misses': 0}
+        token = request_cache_stats.set(stats)
+        elapsed = 0.0
+        try:
+            for i in range(iterations):
+                if before is not None:
+                    before(i)
+                started = time.perf_counter()
+                render()
+                elapsed += time.perf_counter() - started
+        finally:
+            request_cache_stats.reset(token)
+
+        total = stats['hits'] + stats['misses']
+        miss_rate = stats['misses'] / total * 100 if total else 0
+        self.stdout.write(
+            f'{label}: {elapsed / iterations * 1000:.2f} мс на рендер, промахов кэша {miss_rate:.1f}%'
+        )
@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand
+from fefu_lab.benchmarks import run_load
+
+
+class Command(BaseCommand):
+    help = 'HTTP-нагрузка на запущенный сервер: запросы в секунду и задержка p50/p95/p99'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Адрес сервера')
+        parser.add_argument(
+            '--path',
+            action='append',
+            dest='paths',
+            help='Страница для нагрузки, можно указать несколько раз (по умолчанию /, /courses/, /students/)'
+        )
+        parser.add_argument('--concurrency', type=int, default=8, help='Одновременных клиентов')
+        parser.add_argument('--duration', type=float, default=10, help='Длительность замера, сек.')
+        parser.add_argument('--warmup', type=float, default=2, help='Прогрев перед замером, сек.')
+        parser.add_argument('--label', default='', help='Подпись результата, например режим соединений')
+        parser.add_argument('--json', action='store_true', help='Вывести результат одной строкой JSON')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/', '/courses/', '/students/']
+        result = run_load(
+            options['url'],
+            paths,
+            concurrency=options['concurrency'],
+            duration=options['duration'],
+            warmup=options['warmup']
+        )
+        result['label'] = options['label']
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, ensure_ascii=False))
+            return
+
+        self.stdout.write(
+            f'{options["label"] or options["url"]}: {result["rps"]} запросов/с, '
+            f'p50 {result["p50_ms"]} мс, p95 {result["p95_ms"]} мс, p99 {result["p99_ms"]} мс, '
+            f'ошибок {result["errors"]}'
+        )
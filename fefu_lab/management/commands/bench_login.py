@@ -0,0 +1,89 @@
+import json
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management.base import BaseCommand, CommandError
+from fefu_lab.benchmarks import fetch_cookies, run_load
+
+
+class Command(BaseCommand):
+    help = (
+        'Попытки входа в секунду на запущенном сервере: без срабатывания лимита '
+        '(каждая попытка считает хеш пароля) и с одного адреса после исчерпания лимита. '
+        'Для замера на один воркер запустите gunicorn с GUNICORN_WORKERS=1'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Адрес сервера')
+        parser.add_argument('--concurrency', type=int, default=4, help='Одновременных клиентов')
+        parser.add_argument('--duration', type=float, default=10, help='Длительность каждого замера, сек.')
+        parser.add_argument('--json', action='store_true', help='Вывести результат одной строкой JSON')
+
+    def handle(self, *args, **options):
+        token = self._csrf_token(options['url'])
+        base_headers = {
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Cookie': f'{settings.CSRF_COOKIE_NAME}={token}',
+        }
+
+        def form(n):
+            return urlencode({
+                'csrfmiddlewaretoken': token,
+                'username': f'bench-nobody-{n}',
+                'password': 'wrong-password',
+            })
+
+        def spoofed_ip(n):
+            # Каждая попытка с нового адреса: сервер доверяет заголовку CLIENT_IP_HEADER
+            return {**base_headers, 'X-Real-IP': f'10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}'}
+
+        load = dict(
+            paths=['/login/'],
+            method='POST',
+            body=form,
+            concurrency=options['concurrency'],
+            duration=options['duration'],
+            # Неверный пароль - 200 с формой, отказ по лимиту - 429
+            accept={200, 429},
+        )
+        results = {
+            'hashes_per_sec': self._hash_rate(),
+            'unthrottled': run_load(options['url'], headers=spoofed_ip, warmup=1, **load),
+            # Прогрев расходует корзину адреса, дальше все попытки отклоняются до хеширования
+            'throttled': run_load(
+                options['url'],
+                headers={**base_headers, 'X-Real-IP': '192.0.2.1'},
+                warmup=2,
+                **load
+            ),
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+
+        self.stdout.write(f'PBKDF2 в одном потоке: {results["hashes_per_sec"]} хешей/с')
+        for label in ('unthrottled', 'throttled'):
+            result = results[label]
+            self.stdout.write(
+                f'{label}: {result["rps"]} попыток/с, p50 {result["p50_ms"]} мс, '
+                f'p99 {result["p99_ms"]} мс, статусы {result["statuses"]}, ошибок {result["errors"]}'
+            )
+
+    @staticmethod
+    def _hash_rate(seconds=2.0):
+        encoded = make_password('bench-password')
+        count, started = 0, time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            check_password('bench-password', encoded)
+            count += 1
+        return round(count / (time.perf_counter() - started), 1)
+
+    @staticmethod
+    def _csrf_token(url):
+        _, cookies = fetch_cookies(url, '/login/')
+        if settings.CSRF_COOKIE_NAME not in cookies:
+            raise CommandError('Сервер не выдал CSRF-cookie на /login/')
+        return cookies[settings.CSRF_COOKIE_NAME].value
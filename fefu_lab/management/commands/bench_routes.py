@@ -0,0 +1,135 @@
+import json
+import os
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from fefu_lab import urls as app_urls
+from fefu_lab.benchmarks import compare_results, fetch_cookies, run_load
+from fefu_lab.management.commands.seed_data import SEED_PASSWORD, SEED_PREFIX
+from fefu_lab.models import Student, Course
+
+# Пользователи seed_data для каждой роли
+ROLE_USERNAMES = {
+    'student': f'{SEED_PREFIX}student_0',
+    'teacher': f'{SEED_PREFIX}teacher_0',
+    'admin': f'{SEED_PREFIX}admin',
+}
+# logout завершил бы сессию роли посреди замера
+SKIPPED_ROUTES = {'logout'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузка на каждую именованную страницу fefu_lab.urls анонимно и под каждой ролью: '
+        'запросы в секунду, p50/p95/p99 и SQL-запросы на запрос (сервер должен быть запущен '
+        'с INSTRUMENTATION_SAMPLE_RATE=1 и SERVER_TIMING_PUBLIC=True). '
+        'С --baseline регрессии завершают команду с ошибкой'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Адрес сервера')
+        parser.add_argument(
+            '--role',
+            action='append',
+            dest='roles',
+            choices=['anonymous', *ROLE_USERNAMES],
+            help='Роль, можно указать несколько раз (по умолчанию все)'
+        )
+        parser.add_argument('--route', action='append', dest='routes', help='Только эти имена URL')
+        parser.add_argument('--concurrency', type=int, default=4, help='Одновременных клиентов')
+        parser.add_argument('--duration', type=float, default=5, help='Длительность замера страницы, сек.')
+        parser.add_argument('--warmup', type=float, default=1, help='Прогрев перед замером, сек.')
+        parser.add_argument('--label', default='', help='Подпись замера, например объем данных')
+        parser.add_argument('--output', help='Сохранить результат в JSON')
+        parser.add_argument('--baseline', help='Эталонный JSON прошлого замера для сравнения')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Допустимое ухудшение rps и p95, доля')
+
+    def handle(self, *args, **options):
+        roles = options['roles'] or ['anonymous', *ROLE_USERNAMES]
+        paths = self._route_paths(options['routes'])
+        results = {
+            'meta': {
+                'label': options['label'],
+                'students': Student.objects.count(),
+                'concurrency': options['concurrency'],
+                'duration': options['duration'],
+            },
+            'routes': {},
+        }
+
+        for role in roles:
+            headers = {} if role == 'anonymous' else {'Cookie': self._login(options['url'], ROLE_USERNAMES[role])}
+            for name, path in paths.items():
+                result = run_load(
+                    options['url'],
+                    [path],
+                    concurrency=options['concurrency'],
+                    duration=options['duration'],
+                    warmup=options['warmup'],
+                    headers=headers
+                )
+                results['routes'][f'{role}:{name}'] = result
+                self.stdout.write(
+                    f'{role:9} {name:20} {result["rps"]:8} запросов/с  '
+                    f'p50 {result["p50_ms"]} p95 {result["p95_ms"]} p99 {result["p99_ms"]} мс  '
+                    f'SQL {result["queries"]}  коды {result["statuses"]}'
+                )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
+
+        if options['baseline']:
+            if not os.path.exists(options['baseline']):
+                self.stdout.write(self.style.WARNING(f'Эталона {options["baseline"]} нет, сравнение пропущено'))
+                return
+            with open(options['baseline'], encoding='utf-8') as source:
+                baseline = json.load(source)
+            regressions = compare_results(results, baseline, options['tolerance'])
+            for regression in regressions:
+                self.stderr.write(self.style.ERROR(regression))
+            if regressions:
+                raise CommandError(f'Регрессий относительно {options["baseline"]}: {len(regressions)}')
+            self.stdout.write(self.style.SUCCESS('Регрессий относительно эталона нет'))
+
+    def _route_paths(self, only=None):
+        """
+        Имя URL -> путь; параметры берутся из существующих курса и студента
+        """
+        course = Course.objects.filter(is_active=True).order_by('pk').values_list('slug', flat=True).first()
+        student = Student.objects.filter(is_active=True, role='STUDENT').order_by('pk').values_list('pk', flat=True).first()
+        if course is None or student is None:
+            raise CommandError('Нет данных для страниц с параметрами, запустите seed_data')
+        samples = {'pk': student, 'course_slug': course, 'slug': course, 'dataset': 'courses', 'fmt': 'csv'}
+
+        paths = {}
+        for pattern in app_urls.urlpatterns:
+            name = pattern.name
+            if not name or name in SKIPPED_ROUTES or (only and name not in only):
+                continue
+            kwargs = {key: samples[key] for key in pattern.pattern.converters}
+            paths[name] = reverse(name, kwargs=kwargs)
+        return paths
+
+    def _login(self, url, username):
+        """
+        Входит через форму /login/ и возвращает заголовок Cookie с сессией
+        """
+        csrf_name, session_name = settings.CSRF_COOKIE_NAME, settings.SESSION_COOKIE_NAME
+        _, cookies = fetch_cookies(url, '/login/')
+        token = cookies[csrf_name].value
+        status, cookies = fetch_cookies(
+            url,
+            '/login/',
+            method='POST',
+            body=urlencode({'csrfmiddlewaretoken': token, 'username': username, 'password': SEED_PASSWORD}),
+            headers={
+                'Content-Type': 'application/x-www-form-urlencoded',
+                'Cookie': f'{csrf_name}={token}',
+            }
+        )
+        if status != 302 or session_name not in cookies:
+            raise CommandError(f'Не удалось войти как {username}: ответ {status}')
+        return f'{session_name}={cookies[session_name].value}; {csrf_name}={token}'
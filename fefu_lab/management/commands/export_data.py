@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from fefu_lab.exports import DATASETS, FORMATS, export_chunks, export_lines, export_queryset
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка студентов, курсов или записей на курсы в CSV/JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS), help='Что выгружать')
+        parser.add_argument('--format', choices=list(FORMATS), default='csv', help='Формат файла')
+        parser.add_argument('--output', default='-', help='Файл выгрузки, "-" - стандартный вывод')
+        parser.add_argument('--faculty', help='Факультет студента (students, enrollments)')
+        parser.add_argument('--status', help='Статус записи (enrollments)')
+        parser.add_argument('--from', dest='date_from', help='С даты ГГГГ-ММ-ДД включительно')
+        parser.add_argument('--to', dest='date_to', help='По дату ГГГГ-ММ-ДД включительно')
+
+    def handle(self, *args, **options):
+        try:
+            queryset = export_queryset(
+                options['dataset'],
+                faculty=options['faculty'],
+                status=options['status'],
+                date_from=options['date_from'],
+                date_to=options['date_to']
+            )
+        except ValueError as error:
+            raise CommandError(error)
+
+        chunks = export_chunks(export_lines(options['dataset'], queryset, options['format']))
+        if options['output'] == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stderr.write(f'Выгрузка записана в {options["output"]}')
@@ -0,0 +1,268 @@
+import csv
+import json
+import sys
+import time
+from collections import Counter
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from fefu_lab.bulk import copy_rows
+from fefu_lab.caching import bump_version
+from fefu_lab.models import Student, Course, Enrollment
+from fefu_lab.services import sync_course_counters
+
+STATUSES = {choice for choice, _ in Enrollment.STATUS_CHOICES}
+
+
+class Command(BaseCommand):
+    help = (
+        'Массовая запись на курсы из CSV или JSONL. Поля строки: student (логин), '
+        'course (slug курса), необязательный status (по умолчанию ACTIVE). '
+        'Отклоненные строки с причиной пишутся в отчет CSV'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл CSV/JSONL, "-" - стандартный ввод')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='Формат файла (по умолчанию по расширению)'
+        )
+        parser.add_argument(
+            '--rejects',
+            help='Файл отчета об отклоненных строках (по умолчанию <path>.rejected.csv)'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Строк в одной транзакции')
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Использовать bulk_create даже на PostgreSQL'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        rejects_path = options['rejects'] or (
+            'rejected.csv' if path == '-' else f'{path}.rejected.csv'
+        )
+        self.batch_size = options['batch_size']
+        self.use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+        # slug -> pk; курсов немного, карта живет весь импорт
+        self.course_ids = {}
+        self.rejects_path = rejects_path
+        self.report = None
+        self.reasons = Counter()
+        # Строки, прошедшие проверки, но уже записанные мимо блокировки курса
+        self.skipped = 0
+        imported = total = 0
+
+        started = time.perf_counter()
+        source = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+        try:
+            rows = self._read_jsonl(source) if file_format == 'jsonl' else self._read_csv(source)
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    imported += self._import_batch(batch)
+                total += len(batch)
+                self.stdout.write(f'  обработано строк: {total}', ending='\r')
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if self.report is not None:
+                self.report.close()
+
+        if imported:
+            # Сигналы при массовой вставке не срабатывают, кэш сбрасываем сами
+            bump_version('stats')
+            bump_version('catalog')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Записано: {imported} из {total} строк за {elapsed:.1f} с '
+                f'({total / elapsed if elapsed else 0:.0f} строк/с)'
+            )
+        )
+        if self.skipped:
+            self.stdout.write(self.style.WARNING(
+                f'Пропущено строк, записанных параллельно: {self.skipped}'
+            ))
+        if self.reasons:
+            for reason, count in self.reasons.most_common():
+                self.stdout.write(f'  {reason}: {count}')
+            self.stdout.write(self.style.WARNING(
+                f'Отклонено строк: {sum(self.reasons.values())}, отчет: {rejects_path}'
+            ))
+
+    # ----- чтение -----
+
+    def _read_csv(self, source):
+        reader = csv.DictReader(source)
+        if reader.fieldnames is None or not {'student', 'course'} <= set(reader.fieldnames):
+            raise CommandError('В CSV нужны колонки student и course')
+        for record in reader:
+            yield reader.line_num, record
+
+    def _read_jsonl(self, source):
+        for line_num, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if not isinstance(record, dict):
+                self._reject(line_num, '', '', 'некорректная строка JSON')
+                continue
+            yield line_num, record
+
+    # ----- пакет -----
+
+    def _import_batch(self, batch):
+        """
+        Проверяет и вставляет пакет строк, возвращает число новых записей
+        """
+        parsed = []
+        for line_num, record in batch:
+            username = str(record.get('student') or '').strip()
+            slug = str(record.get('course') or '').strip()
+            status = str(record.get('status') or 'ACTIVE').strip().upper()
+            if not username or not slug:
+                self._reject(line_num, username, slug, 'не указан студент или курс')
+            elif status not in STATUSES:
+                self._reject(line_num, username, slug, f'неизвестный статус {status}')
+            else:
+                parsed.append((line_num, username, slug, status))
+
+        # Карты логин -> студент и slug -> курс: по одному запросу на пакет
+        students = {
+            username: (pk, is_active)
+            for username, pk, is_active in Student.objects.filter(
+                user__username__in={username for _, username, _, _ in parsed}
+            ).values_list('user__username', 'pk', 'is_active')
+        }
+        missing_slugs = {slug for _, _, slug, _ in parsed} - self.course_ids.keys()
+        if missing_slugs:
+            found = dict(Course.objects.filter(slug__in=missing_slugs).values_list('slug', 'pk'))
+            # Ненайденные slug тоже запоминаем, чтобы не искать их в каждом пакете
+            self.course_ids.update({slug: found.get(slug) for slug in missing_slugs})
+
+        resolved = []
+        for line_num, username, slug, status in parsed:
+            student = students.get(username)
+            course_id = self.course_ids.get(slug)
+            if student is None:
+                self._reject(line_num, username, slug, 'студент не найден')
+            elif not student[1]:
+                self._reject(line_num, username, slug, 'студент неактивен')
+            elif course_id is None:
+                self._reject(line_num, username, slug, 'курс не найден')
+            else:
+                resolved.append((line_num, username, slug, status, student[0], course_id))
+        if not resolved:
+            return 0
+
+        # Блокируем курсы пакета в порядке pk: enroll() и параллельный импорт
+        # ждут, пока места и счетчики не будут обновлены этой транзакцией
+        course_ids = {row[5] for row in resolved}
+        free_seats = {}
+        active_courses = set()
+        for pk, is_active, max_students, active in (
+            Course.objects.select_for_update()
+            .filter(pk__in=course_ids)
+            .order_by('pk')
+            .values_list('pk', 'is_active', 'max_students', 'active_enrollments')
+        ):
+            free_seats[pk] = max_students - active
+            if is_active:
+                active_courses.add(pk)
+
+        existing = set(
+            Enrollment.objects.filter(
+                student_id__in={row[4] for row in resolved},
+                course_id__in=course_ids
+            ).values_list('student_id', 'course_id')
+        )
+
+        now = timezone.now()
+        accepted = []
+        seen = set()
+        for line_num, username, slug, status, student_id, course_id in resolved:
+            pair = (student_id, course_id)
+            if pair in existing:
+                self._reject(line_num, username, slug, 'студент уже записан на курс')
+                continue
+            if pair in seen:
+                self._reject(line_num, username, slug, 'повтор строки в файле')
+                continue
+            if status == 'ACTIVE':
+                if course_id not in active_courses:
+                    self._reject(line_num, username, slug, 'курс неактивен')
+                    continue
+                if free_seats[course_id] <= 0:
+                    self._reject(line_num, username, slug, 'на курсе нет свободных мест')
+                    continue
+                free_seats[course_id] -= 1
+            seen.add(pair)
+            accepted.append({
+                'student_id': student_id,
+                'course_id': course_id,
+                'enrolled_at': now,
+                'status': status,
+                'completed_at': now if status == 'COMPLETED' else None,
+            })
+        if not accepted:
+            return 0
+
+        inserted = self._insert(accepted)
+        self.skipped += len(accepted) - inserted
+        # Счетчик пересчитывается по фактическим строкам: ignore_conflicts
+        # не сообщает, какие из них были пропущены
+        sync_course_counters(course_ids)
+        Student.objects.filter(pk__in={row['student_id'] for row in accepted}).update(
+            enrollments_version=F('enrollments_version') + 1
+        )
+        return inserted
+
+    def _insert(self, rows):
+        """
+        Вставляет строки и возвращает число действительно добавленных записей
+        """
+        if self.use_copy:
+            try:
+                with transaction.atomic():
+                    copy_rows(Enrollment, rows)
+                return len(rows)
+            except IntegrityError:
+                # Пару успели записать мимо блокировки курса (например, из админки)
+                pass
+        # ignore_conflicts молча пропускает существующие пары, поэтому
+        # добавленные считаем по числу записей пакета до и после вставки
+        batch = Enrollment.objects.filter(
+            student_id__in={row['student_id'] for row in rows},
+            course_id__in={row['course_id'] for row in rows}
+        )
+        before = batch.count()
+        Enrollment.objects.bulk_create(
+            [Enrollment(**row) for row in rows],
+            batch_size=self.batch_size,
+            ignore_conflicts=True
+        )
+        return batch.count() - before
+
+    # ----- отчет -----
+
+    def _reject(self, line_num, username, slug, reason):
+        # Отчет создается при первой отклоненной строке и пишется потоково
+        if self.report is None:
+            self.report = open(self.rejects_path, 'w', encoding='utf-8', newline='')
+            self.report_writer = csv.writer(self.report)
+            self.report_writer.writerow(['line', 'student', 'course', 'reason'])
+        self.report_writer.writerow([line_num, username, slug, reason])
+        self.reasons[reason] += 1
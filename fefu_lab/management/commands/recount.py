@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Q
+from fefu_lab.caching import bump_version
+from fefu_lab.models import Course
+from fefu_lab.services import active_enrollments_count
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики активных записей на курсы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не изменяя'
+        )
+
+    def handle(self, *args, **options):
+        drifted = (
+            Course.objects
+            .annotate(actual=Count('enrollments', filter=Q(enrollments__status='ACTIVE')))
+            .exclude(active_enrollments=F('actual'))
+            .only('pk', 'slug', 'active_enrollments')
+        )
+
+        # Значение берется подзапросом в момент UPDATE, чтобы не затереть
+        # изменения, сделанные параллельными записями после чтения
+        actual_count = active_enrollments_count()
+
+        fixed = 0
+        for course in drifted.iterator():
+            self.stdout.write(
+                f'{course.slug}: {course.active_enrollments} -> {course.actual}'
+            )
+            if not options['dry_run']:
+                Course.objects.filter(pk=course.pk).update(
+                    active_enrollments=actual_count,
+                    enrollments_version=F('enrollments_version') + 1
+                )
+            fixed += 1
+
+        if options['dry_run']:
+            self.stdout.write(f'Найдено расхождений: {fixed}')
+        else:
+            if fixed:
+                # Сумма счетчиков входит в статистику главной и панели администратора
+                bump_version('stats')
+                bump_version('catalog')
+            self.stdout.write(self.style.SUCCESS(f'Исправлено счетчиков: {fixed}'))
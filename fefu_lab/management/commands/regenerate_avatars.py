@@ -0,0 +1,57 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from fefu_lab.avatars import generate_thumbnails, mark_ready
+from fefu_lab.models import Student
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры аватаров для существующих файлов в пуле процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Количество процессов'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перестроить и уже готовые миниатюры (например, после смены размеров)'
+        )
+
+    def handle(self, *args, **options):
+        students = Student.objects.exclude(avatar='').exclude(avatar__isnull=True)
+        if not options['all']:
+            students = students.filter(avatar_thumbnails_ready=False)
+        pending = dict(students.values_list('avatar', 'pk'))
+        if not pending:
+            self.stdout.write('Нет аватаров для обработки')
+            return
+
+        done, failed = {}, 0
+        started = time.perf_counter()
+        # Процессы только читают и пишут файлы, флаги в БД ставит родитель
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {pool.submit(generate_thumbnails, name): name for name in pending}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'{name}: {type(exc).__name__}: {exc}')
+                else:
+                    done[name] = pending[name]
+        mark_ready(done)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'Процессов: {options["workers"]}, обработано: {len(done)}, '
+            f'ошибок: {failed}, время: {elapsed:.1f} с'
+        )
+        if done:
+            self.stdout.write(self.style.SUCCESS(f'Миниатюры готовы для {len(done)} аватаров'))
@@ -1,155 +1,322 @@
-from django.core.management.base import BaseCommand
+import random
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from fefu_lab.bulk import copy_rows
+from fefu_lab.caching import bump_version
 from fefu_lab.models import Student, Instructor, Course, Enrollment
-from datetime import date, timedelta
+
+SEED_PREFIX = 'seed_'
+SEED_PASSWORD = 'password123'
+
+FIRST_NAMES = [
+    'Анна', 'Дмитрий', 'Екатерина', 'Михаил', 'Ольга', 'Иван', 'Мария',
+    'Алексей', 'Софья', 'Никита', 'Полина', 'Артем', 'Дарья', 'Егор',
+]
+LAST_NAMES = [
+    'Иванова', 'Смирнов', 'Попова', 'Васильев', 'Новикова', 'Петров',
+    'Сидорова', 'Козлов', 'Морозова', 'Волков', 'Лебедева', 'Соколов',
+]
+SPECIALIZATIONS = [
+    'Кибербезопасность', 'Веб-разработка', 'Сетевые технологии',
+    'Анализ данных', 'Программная инженерия',
+]
+DEGREES = ['', 'Кандидат технических наук', 'Доктор технических наук']
+COURSE_TOPICS = [
+    'Основы Python', 'Веб-безопасность', 'Современный JavaScript',
+    'Защита сетей', 'Базы данных', 'Криптография', 'Алгоритмы',
+]
+LEVELS = [choice for choice, _ in Course.LEVEL_CHOICES]
+FACULTIES = [choice for choice, _ in Student.FACULTY_CHOICES]
+
 
 class Command(BaseCommand):
-    help = 'Заполняет базу данных тестовыми данными'
-    
+    help = (
+        'Генерирует детерминированные тестовые данные произвольного объема. '
+        f'Пароль всех созданных пользователей: {SEED_PASSWORD}'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=5, help='Количество студентов')
+        parser.add_argument('--instructors', type=int, default=3, help='Количество преподавателей')
+        parser.add_argument('--courses', type=int, default=4, help='Количество курсов')
+        parser.add_argument('--enrollments', type=int, default=7, help='Количество записей на курсы')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пакета вставки')
+        parser.add_argument('--seed', type=int, default=42, help='Начальное значение генератора')
+        parser.add_argument(
+            '--no-clear',
+            action='store_true',
+            help='Не удалять ранее созданные данные (имена новых пользователей получат номер запуска)'
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Использовать bulk_create даже на PostgreSQL'
+        )
+
     def handle(self, *args, **options):
+        students = options['students']
+        courses = options['courses']
+        enrollments = options['enrollments']
+        if courses < 1 and enrollments:
+            raise CommandError('Для записей на курсы нужен хотя бы один курс')
+        if enrollments > students * courses:
+            raise CommandError(
+                f'Не больше {students * courses} уникальных записей для '
+                f'{students} студентов и {courses} курсов'
+            )
+
+        self.batch_size = options['batch_size']
+        self.use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+        self.rng = random.Random(options['seed'])
+        self.seed = options['seed']
+        self.now = timezone.now()
+        # Хеш считаем один раз: PBKDF2 на каждого пользователя занял бы часы
+        self.password_hash = make_password(SEED_PASSWORD)
+
         self.stdout.write('Создание тестовых данных...')
-        
-        # Очищаем существующие данные (осторожно!)
-        Enrollment.objects.all().delete()
-        Course.objects.all().delete()
-        Student.objects.all().delete()
-        Instructor.objects.all().delete()
-        
-        # Создаем преподавателей
-        instructors = [
-            Instructor(
-                first_name='Иван',
-                last_name='Петров',
-                email='i.petrov@fefu.ru',
-                specialization='Кибербезопасность',
-                degree='Кандидат технических наук'
-            ),
-            Instructor(
-                first_name='Мария',
-                last_name='Сидорова',
-                email='m.sidorova@fefu.ru',
-                specialization='Веб-разработка',
-                degree='Доктор технических наук'
-            ),
-            Instructor(
-                first_name='Алексей',
-                last_name='Козлов',
-                email='a.kozlov@fefu.ru',
-                specialization='Сетевые технологии',
-                degree='Кандидат технических наук'
-            ),
-        ]
-        
-        for instructor in instructors:
-            instructor.save()
-        
-        # Создаем студентов
-        students = [
-            Student(
-                first_name='Анна',
-                last_name='Иванова',
-                email='anna.ivanova@fefu.ru',
-                birth_date=date(2000, 5, 15),
-                faculty='CS'
-            ),
-            Student(
-                first_name='Дмитрий',
-                last_name='Смирнов',
-                email='dmitry.smirnov@fefu.ru',
-                birth_date=date(1999, 8, 22),
-                faculty='SE'
-            ),
-            Student(
-                first_name='Екатерина',
-                last_name='Попова',
-                email='ekaterina.popova@fefu.ru',
-                birth_date=date(2001, 3, 10),
-                faculty='IT'
-            ),
-            Student(
-                first_name='Михаил',
-                last_name='Васильев',
-                email='mikhail.vasilyev@fefu.ru',
-                birth_date=date(2000, 11, 5),
-                faculty='DS'
-            ),
-            Student(
-                first_name='Ольга',
-                last_name='Новикова',
-                email='olga.novikova@fefu.ru',
-                birth_date=date(1999, 12, 30),
-                faculty='WEB'
-            ),
-        ]
-        
-        for student in students:
-            student.save()
-        
-        # Создаем курсы
-        courses = [
-            Course(
-                title='Основы Python',
-                slug='python-basics',
-                description='Базовый курс по программированию на языке Python. Изучение синтаксиса, структур данных и основ ООП.',
-                duration=36,
-                instructor=instructors[0],
-                level='BEGINNER',
-                max_students=25,
-                price=0
-            ),
-            Course(
-                title='Веб-безопасность',
-                slug='web-security',
-                description='Продвинутый курс по защите веб-приложений. SQL-инъекции, XSS, CSRF и другие уязвимости.',
-                duration=48,
-                instructor=instructors[0],
-                level='ADVANCED',
-                max_students=20,
-                price=15000
-            ),
-            Course(
-                title='Современный JavaScript',
-                slug='modern-javascript',
-                description='Изучение современных возможностей JavaScript: ES6+, асинхронное программирование, фреймворки.',
-                duration=42,
-                instructor=instructors[1],
-                level='INTERMEDIATE',
-                max_students=30,
-                price=12000
-            ),
-            Course(
-                title='Защита сетей',
-                slug='network-defense',
-                description='Курс по защите компьютерных сетей. Firewalls, IDS/IPS, VPN и методы атак на сети.',
-                duration=40,
-                instructor=instructors[2],
-                level='ADVANCED',
-                max_students=15,
-                price=18000
-            ),
-        ]
-        
-        for course in courses:
-            course.save()
-        
-        # Создаем записи на курсы
-        enrollments = [
-            Enrollment(student=students[0], course=courses[0], status='ACTIVE'),
-            Enrollment(student=students[0], course=courses[1], status='ACTIVE'),
-            Enrollment(student=students[1], course=courses[0], status='ACTIVE'),
-            Enrollment(student=students[1], course=courses[2], status='ACTIVE'),
-            Enrollment(student=students[2], course=courses[0], status='ACTIVE'),
-            Enrollment(student=students[3], course=courses[3], status='ACTIVE'),
-            Enrollment(student=students[4], course=courses[2], status='ACTIVE'),
-        ]
-        
-        for enrollment in enrollments:
-            enrollment.save()
-        
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            if not options['no_clear']:
+                self._clear()
+
+            user_base = self._next_id(User)
+            # Повторный запуск без очистки: seed_admin уже занят, поэтому имена
+            # этого запуска получают номер по первому id, например seed_120_student_0
+            self.username_prefix = SEED_PREFIX
+            if User.objects.filter(username=f'{SEED_PREFIX}admin').exists():
+                self.username_prefix = f'{SEED_PREFIX}{user_base}_'
+            instructor_base = self._next_id(Instructor)
+            course_base = self._next_id(Course)
+            student_base = self._next_id(Student)
+            enrollment_base = self._next_id(Enrollment)
+
+            instructors = options['instructors']
+            # Пользователи: администратор, преподаватели, затем студенты
+            total_users = 1 + instructors + students
+            self._insert(User, self._users(user_base, instructors, students), total_users)
+            self._insert(Student, self._students(student_base, user_base, total_users, instructors), total_users)
+            self._insert(Instructor, self._instructors(instructor_base, user_base, instructors), instructors)
+            self._insert(Course, self._courses(course_base, instructor_base, instructors, courses), courses)
+            self._insert(
+                Enrollment,
+                self._enrollments(
+                    enrollment_base,
+                    student_base + 1 + instructors,
+                    students,
+                    course_base,
+                    courses,
+                    enrollments
+                ),
+                enrollments
+            )
+
+            self._sync_counters()
+            self._reset_sequences()
+
+        # Сигналы при массовой вставке не срабатывают, кэш сбрасываем сами
+        bump_version('stats')
+        bump_version('catalog')
+
+        elapsed = time.perf_counter() - started
         self.stdout.write(
             self.style.SUCCESS(
-                f'Успешно создано: {len(instructors)} преподавателей, '
-                f'{len(students)} студентов, {len(courses)} курсов, '
-                f'{len(enrollments)} записей на курсы'
+                f'Успешно создано: {instructors} преподавателей, '
+                f'{students} студентов, {courses} курсов, '
+                f'{enrollments} записей на курсы за {elapsed:.1f} с; '
+                f'администратор {self.username_prefix}admin'
             )
-        )
\ No newline at end of file
+        )
+
+    # ----- очистка и служебные операции -----
+
+    def _clear(self):
+        # Удаляем SQL-запросами: QuerySet.delete() загрузил бы каждую строку ради сигналов
+        seed_users = f"SELECT id FROM {self._table(User)} WHERE username LIKE %s ESCAPE '\\'"
+        pattern = SEED_PREFIX.replace('_', '\\_') + '%'
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self._table(Enrollment)}')
+            cursor.execute(f'DELETE FROM {self._table(Course)}')
+            cursor.execute(f'DELETE FROM {self._table(Instructor)}')
+            cursor.execute(
+                f'DELETE FROM {self._table(Student)} WHERE user_id IN ({seed_users})',
+                [pattern]
+            )
+            cursor.execute(f"DELETE FROM {self._table(User)} WHERE username LIKE %s ESCAPE '\\'", [pattern])
+
+    def _table(self, model):
+        return connection.ops.quote_name(model._meta.db_table)
+
+    def _next_id(self, model):
+        last = model.objects.order_by('-pk').values_list('pk', flat=True).first()
+        return (last or 0) + 1
+
+    def _sync_counters(self):
+        active_count = Coalesce(Subquery(
+            Enrollment.objects
+            .filter(course=OuterRef('pk'), status='ACTIVE')
+            .order_by()
+            .values('course')
+            .annotate(total=Count('pk'))
+            .values('total')
+        ), 0)
+        # Версия записей входит в ключи кэша фрагментов и ETag страниц курсов
+        Course.objects.update(
+            active_enrollments=active_count,
+            enrollments_version=F('enrollments_version') + 1
+        )
+        Course.objects.filter(max_students__lt=F('active_enrollments')).update(
+            max_students=F('active_enrollments')
+        )
+
+    def _reset_sequences(self):
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Student, Instructor, Course, Enrollment]
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    # ----- запись пакетами -----
+
+    def _insert(self, model, rows, total):
+        """
+        Потоково вставляет строки (словари attname -> значение) пакетами
+        """
+        label = model._meta.verbose_name_plural
+        done = 0
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            if self.use_copy:
+                copy_rows(model, batch)
+            else:
+                model.objects.bulk_create([model(**row) for row in batch])
+            done += len(batch)
+            self.stdout.write(f'  {label}: {done}/{total}', ending='\r')
+        self.stdout.write(f'  {label}: {done}/{total}')
+
+    # ----- генераторы строк -----
+
+    def _users(self, base, instructors, students):
+        prefix = self.username_prefix
+        yield self._user_row(base, f'{prefix}admin', 'Админ', 'Системный', is_staff=True)
+        for i in range(instructors):
+            yield self._user_row(
+                base + 1 + i,
+                f'{prefix}teacher_{i}',
+                self.rng.choice(FIRST_NAMES),
+                self.rng.choice(LAST_NAMES)
+            )
+        for i in range(students):
+            yield self._user_row(
+                base + 1 + instructors + i,
+                f'{prefix}student_{i}',
+                self.rng.choice(FIRST_NAMES),
+                self.rng.choice(LAST_NAMES)
+            )
+
+    def _user_row(self, pk, username, first_name, last_name, is_staff=False):
+        return {
+            'id': pk,
+            'password': self.password_hash,
+            'last_login': None,
+            'is_superuser': False,
+            'username': username,
+            'first_name': first_name,
+            'last_name': last_name,
+            'email': f'{username}@example.com',
+            'is_staff': is_staff,
+            'is_active': True,
+            'date_joined': self.now,
+        }
+
+    def _students(self, base, user_base, total_users, instructors):
+        for i in range(total_users):
+            if i == 0:
+                role = 'ADMIN'
+            elif i <= instructors:
+                role = 'TEACHER'
+            else:
+                role = 'STUDENT'
+            yield {
+                'id': base + i,
+                'user_id': user_base + i,
+                'phone': f'+7914{self.rng.randrange(10 ** 7):07d}',
+                'avatar': '',
+                'avatar_thumbnails_ready': False,
+                'bio': '',
+                'role': role,
+                'faculty': self.rng.choice(FACULTIES),
+                'birth_date': (self.now - timedelta(days=self.rng.randrange(18 * 365, 30 * 365))).date(),
+                'is_active': True,
+                'enrollments_version': 0,
+                'created_at': self.now,
+                'updated_at': self.now,
+            }
+
+    def _instructors(self, base, user_base, count):
+        for i in range(count):
+            yield {
+                'id': base + i,
+                'user_id': user_base + 1 + i,
+                'first_name': self.rng.choice(FIRST_NAMES),
+                'last_name': self.rng.choice(LAST_NAMES),
+                'email': f'instructor{base + i}@fefu.ru',
+                'specialization': self.rng.choice(SPECIALIZATIONS),
+                'degree': self.rng.choice(DEGREES),
+                'is_active': True,
+                'created_at': self.now,
+            }
+
+    def _courses(self, base, instructor_base, instructors, count):
+        for i in range(count):
+            topic = COURSE_TOPICS[i % len(COURSE_TOPICS)]
+            yield {
+                'id': base + i,
+                'title': f'{topic} {i + 1}' if count > len(COURSE_TOPICS) else topic,
+                'slug': f'course-{base + i}',
+                'description': f'Курс «{topic}»: теория и практические занятия.',
+                'duration': self.rng.choice([24, 36, 42, 48, 72]),
+                'instructor_id': instructor_base + self.rng.randrange(instructors) if instructors else None,
+                'level': self.rng.choice(LEVELS),
+                'max_students': self.rng.choice([15, 20, 25, 30, 50]),
+                'price': self.rng.choice([0, 5000, 12000, 15000, 18000]),
+                'is_active': True,
+                'active_enrollments': 0,
+                'enrollments_version': 0,
+                # Разносим даты создания, чтобы сортировка по -created_at была осмысленной
+                'created_at': self.now - timedelta(minutes=count - i),
+                'updated_at': self.now,
+            }
+
+    def _enrollments(self, base, student_base, students, course_base, courses, count):
+        # Запись e относится к студенту e % students; для одного студента
+        # курсы идут подряд от его смещения, поэтому пары не повторяются
+        for e in range(count):
+            student = e % students
+            round_number = e // students
+            offset = (student * 2654435761 + self.seed) % courses
+            course = (offset + round_number) % courses
+
+            status = self.rng.choices(['ACTIVE', 'COMPLETED', 'CANCELLED'], [80, 15, 5])[0]
+            enrolled_at = self.now - timedelta(days=self.rng.randrange(365))
+            yield {
+                'id': base + e,
+                'student_id': student_base + student,
+                'course_id': course_base + course,
+                'enrolled_at': enrolled_at,
+                'status': status,
+                'completed_at': enrolled_at + timedelta(days=90) if status == 'COMPLETED' else None,
+            }
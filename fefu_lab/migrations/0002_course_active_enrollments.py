@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:23
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_active_enrollments(apps, schema_editor):
+    Course = apps.get_model('fefu_lab', 'Course')
+    courses = Course.objects.annotate(
+        actual=Count('enrollments', filter=Q(enrollments__status='ACTIVE'))
+    )
+    for course in courses.iterator():
+        if course.actual:
+            Course.objects.filter(pk=course.pk).update(active_enrollments=course.actual)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fefu_lab', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='active_enrollments',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Активных записей'),
+        ),
+        migrations.RunPython(fill_active_enrollments, migrations.RunPython.noop),
+    ]
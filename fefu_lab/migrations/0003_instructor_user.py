@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def link_instructors_by_email(apps, schema_editor):
+    Instructor = apps.get_model('fefu_lab', 'Instructor')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    for instructor in Instructor.objects.filter(user__isnull=True):
+        user = User.objects.filter(email__iexact=instructor.email).order_by('pk').first()
+        if user and not Instructor.objects.filter(user=user).exists():
+            instructor.user = user
+            instructor.save(update_fields=['user'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fefu_lab', '0002_course_active_enrollments'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='instructor',
+            name='user',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='instructor_profile', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.RunPython(link_instructors_by_email, migrations.RunPython.noop),
+    ]
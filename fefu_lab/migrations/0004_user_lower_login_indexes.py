@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.db import IntegrityError, migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+# Сколько групп конфликтующих пользователей показывать в ошибке
+DUPLICATES_SHOWN = 50
+
+
+def _login_constraints():
+    # Пустой email допустим у нескольких пользователей, поэтому индекс частичный
+    return [
+        models.UniqueConstraint(
+            Lower('email'),
+            condition=~models.Q(email=''),
+            name='auth_user_email_lower_uniq'
+        ),
+        models.UniqueConstraint(
+            Lower('username'),
+            name='auth_user_username_lower_uniq'
+        ),
+    ]
+
+
+def _duplicates(User, field):
+    """
+    Значения field без учета регистра, встречающиеся у нескольких
+    пользователей: {значение: [(id, исходное значение), ...]}
+    """
+    users = User.objects.annotate(folded=Lower(field))
+    if field == 'email':
+        users = users.exclude(email='')
+    folded = (
+        users.order_by().values('folded')
+        .annotate(total=Count('pk')).filter(total__gt=1)
+        .values_list('folded', flat=True)[:DUPLICATES_SHOWN]
+    )
+    groups = {}
+    for value, pk, original in users.filter(folded__in=list(folded)).order_by('folded', 'pk').values_list('folded', 'pk', field):
+        groups.setdefault(value, []).append((pk, original))
+    return groups
+
+
+def check_login_duplicates(apps, schema_editor):
+    """
+    Останавливает миграцию до создания индексов, если логины или email
+    совпадают без учета регистра: такие учетные записи нужно объединить
+    или переименовать вручную
+    """
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    lines = []
+    for field in ('username', 'email'):
+        for value, users in _duplicates(User, field).items():
+            listed = ', '.join(f'id={pk} {original!r}' for pk, original in users)
+            lines.append(f'{field} {value!r}: {listed}')
+    if lines:
+        raise IntegrityError(
+            'Пользователи с совпадающими без учета регистра логинами или email '
+            f'(показано до {DUPLICATES_SHOWN} на поле), исправьте их и повторите migrate:\n'
+            + '\n'.join(lines)
+        )
+
+
+def add_login_indexes(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    for constraint in _login_constraints():
+        schema_editor.add_constraint(User, constraint)
+
+
+def remove_login_indexes(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    for constraint in _login_constraints():
+        schema_editor.remove_constraint(User, constraint)
+
+
+class Migration(migrations.Migration):
+    """
+    Функциональные уникальные индексы по lower(email) и lower(username)
+    для EmailBackend. Модель User принадлежит django.contrib.auth,
+    поэтому индексы создаются через schema_editor, а не Meta модели
+    """
+
+    dependencies = [
+        ('fefu_lab', '0003_instructor_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(check_login_duplicates, migrations.RunPython.noop),
+        migrations.RunPython(add_login_indexes, remove_login_indexes),
+    ]
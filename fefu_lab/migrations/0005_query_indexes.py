@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def _user_name_index():
+    # Порядок списка студентов: ORDER BY last_name, first_name, id пользователя
+    return models.Index(fields=['last_name', 'first_name', 'id'], name='auth_user_name_order_idx')
+
+
+def add_user_name_index(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    schema_editor.add_index(User, _user_name_index())
+
+
+def remove_user_name_index(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    schema_editor.remove_index(User, _user_name_index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fefu_lab', '0004_user_lower_login_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at', 'id'], name='course_active_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['course', 'status'], name='enrollment_course_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['student', 'status'], name='enrollment_student_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(condition=models.Q(('status', 'ACTIVE')), fields=['course', '-enrolled_at'], name='enrollment_active_course_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instructor',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['last_name', 'first_name'], name='instructor_active_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['is_active', 'role'], name='student_active_role_idx'),
+        ),
+        migrations.RunPython(add_user_name_index, remove_user_name_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fefu_lab', '0005_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='enrollments_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Версия записей'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fefu_lab', '0007_student_enrollments_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='avatar_thumbnails_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Миниатюры аватара готовы'),
+        ),
+    ]
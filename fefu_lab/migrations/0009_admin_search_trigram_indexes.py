@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+from django.db.models.functions import Upper
+
+# Поиск админки (icontains) выполняет UPPER(поле) LIKE UPPER('%терм%'),
+# GIN-индекс по триграммам того же выражения отвечает на такой LIKE без Seq Scan.
+# username и email нужны автодополнению пользователей (search_fields UserAdmin)
+USER_SEARCH_FIELDS = ['username', 'first_name', 'last_name', 'email']
+
+
+def _trigram_index(field, name):
+    return GinIndex(OpClass(Upper(field), name='gin_trgm_ops'), name=name)
+
+
+def _indexes(apps):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Student = apps.get_model('fefu_lab', 'Student')
+    indexes = [(User, _trigram_index(field, f'auth_user_{field}_trgm_idx')) for field in USER_SEARCH_FIELDS]
+    indexes.append((Student, _trigram_index('phone', 'student_phone_trgm_idx')))
+    return indexes
+
+
+def add_trigram_indexes(apps, schema_editor):
+    # gin_trgm_ops есть только в PostgreSQL
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model, index in _indexes(apps):
+        schema_editor.add_index(model, index)
+
+
+def remove_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model, index in _indexes(apps):
+        schema_editor.remove_index(model, index)
+
+
+class Migration(migrations.Migration):
+    """
+    Триграммные индексы для search_fields StudentAdmin и автодополнения
+    пользователей. Индексы на auth_user создаются через schema_editor,
+    как в 0004 и 0005
+    """
+
+    dependencies = [
+        ('fefu_lab', '0008_student_avatar_thumbnails_ready'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(add_trigram_indexes, remove_trigram_indexes),
+    ]
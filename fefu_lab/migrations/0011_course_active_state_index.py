@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fefu_lab', '0010_enrollment_recent_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['is_active', 'updated_at', 'enrollments_version'], name='course_active_state_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def reset_avatar_thumbnails(apps, schema_editor):
+    # Миниатюры переименованы (в имени сохраняется расширение оригинала):
+    # до запуска regenerate_avatars шаблоны показывают оригиналы
+    Student = apps.get_model('fefu_lab', 'Student')
+    Student.objects.filter(avatar_thumbnails_ready=True).update(avatar_thumbnails_ready=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fefu_lab', '0011_course_active_state_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_avatar_thumbnails, migrations.RunPython.noop),
+    ]
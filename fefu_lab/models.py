@@ -1,9 +1,15 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.urls import reverse
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
 from django.dispatch import receiver
+from django.utils import timezone
+
+from .avatars import discard_thumbnails, schedule_thumbnails
+from .caching import bump_version_on_commit
 
 class UserProfile(models.Model):
     username = models.CharField(max_length=50, unique=True, verbose_name='Логин')
@@ -14,6 +20,15 @@ class UserProfile(models.Model):
     def __str__(self):
         return self.username
 class Instructor(models.Model):
+    # Учетная запись преподавателя для доступа к личному кабинету
+    user = models.OneToOneField(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='instructor_profile',
+        verbose_name='Пользователь'
+    )
     first_name = models.CharField(
         max_length=100,
         verbose_name='Имя'
@@ -48,6 +63,14 @@ class Instructor(models.Model):
         verbose_name = 'Преподаватель'
         verbose_name_plural = 'Преподаватели'
         ordering = ['last_name', 'first_name']
+        indexes = [
+            # Активные преподаватели в порядке сортировки по умолчанию
+            models.Index(
+                fields=['last_name', 'first_name'],
+                condition=models.Q(is_active=True),
+                name='instructor_active_name_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.last_name} {self.first_name}"
@@ -90,6 +113,12 @@ class Student(models.Model):
         null=True, 
         verbose_name='Аватар'
     )
+    # Миниатюры аватара построены фоновым обработчиком (см. avatars.py)
+    avatar_thumbnails_ready = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Миниатюры аватара готовы'
+    )
     bio = models.TextField(
         blank=True,
         verbose_name='О себе'
@@ -115,6 +144,12 @@ class Student(models.Model):
         default=True,
         verbose_name='Активен'
     )
+    # Растет при любом изменении записей студента, входит в ETag профиля
+    enrollments_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Версия записей'
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Дата создания'
@@ -128,9 +163,64 @@ class Student(models.Model):
         verbose_name = 'Профиль студента'
         verbose_name_plural = 'Профили студентов'
         ordering = ['user__last_name', 'user__first_name']
+        indexes = [
+            # Счетчики по ролям в статистике и проверки активности
+            models.Index(fields=['is_active', 'role'], name='student_active_role_idx'),
+        ]
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._remember_state()
+
     def __str__(self):
         return f"{self.user.last_name} {self.user.first_name}"
+
+    def _remember_state(self):
+        # Значения полей на момент загрузки - по ним определяются измененные колонки
+        self._loaded_values = {
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+    def get_dirty_fields(self):
+        """
+        Имена полей, измененных с момента загрузки или последнего сохранения
+        """
+        dirty = []
+        for field in self._meta.concrete_fields:
+            if field.attname not in self.__dict__:
+                continue
+            if field.attname not in self._loaded_values:
+                dirty.append(field.name)
+            elif self.__dict__[field.attname] != self._loaded_values[field.attname]:
+                dirty.append(field.name)
+        return dirty
+
+    @classmethod
+    def bump_enrollments_version(cls, student_id):
+        cls.objects.filter(pk=student_id).update(
+            enrollments_version=F('enrollments_version') + 1
+        )
+
+    def save(self, *args, **kwargs):
+        avatar_changed = bool(self.avatar) if self._state.adding else 'avatar' in self.get_dirty_fields()
+        previous_avatar = None if self._state.adding else self._loaded_values.get('avatar')
+        if avatar_changed:
+            self.avatar_thumbnails_ready = False
+        # Существующий профиль обновляем только по измененным колонкам,
+        # а неизмененный не пишем в БД вовсе
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            dirty = self.get_dirty_fields()
+            if not dirty:
+                return
+            kwargs['update_fields'] = dirty + ['updated_at']
+        super().save(*args, **kwargs)
+        self._remember_state()
+        if avatar_changed and self.avatar:
+            schedule_thumbnails(self.pk, self.avatar.name)
+        if avatar_changed and previous_avatar:
+            discard_thumbnails(getattr(previous_avatar, 'name', previous_avatar))
     
     @property
     def full_name(self):
@@ -154,6 +244,8 @@ class Course(models.Model):
         ('INTERMEDIATE', 'Средний'),
         ('ADVANCED', 'Продвинутый'),
     ]
+    # Поля, которые пишутся только атомарными UPDATE (shift_active_enrollments, services)
+    COUNTER_FIELDS = ('active_enrollments', 'enrollments_version')
     
     title = models.CharField(
         max_length=200,
@@ -198,6 +290,18 @@ class Course(models.Model):
         default=True,
         verbose_name='Активен'
     )
+    # Денормализованный счетчик активных записей, обновляется сигналами Enrollment
+    active_enrollments = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Активных записей'
+    )
+    # Растет при любом изменении записей курса, входит в ключи кэша фрагментов
+    enrollments_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Версия записей'
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Дата создания'
@@ -212,18 +316,66 @@ class Course(models.Model):
         verbose_name_plural = 'Курсы'
         ordering = ['-created_at']
         db_table = 'courses'
+        indexes = [
+            # Каталог и новые курсы: WHERE is_active ORDER BY created_at DESC, id
+            models.Index(
+                fields=['-created_at', 'id'],
+                condition=models.Q(is_active=True),
+                name='course_active_recent_idx'
+            ),
+            # ETag каталога: COUNT, MAX(updated_at) и SUM(enrollments_version)
+            # по активным курсам читаются из индекса, без обращения к таблице
+            models.Index(
+                fields=['is_active', 'updated_at', 'enrollments_version'],
+                name='course_active_state_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
     def get_absolute_url(self):
-        return reverse('course_detail', kwargs={'slug': self.slug})
+        return reverse('course_detail', kwargs={'course_slug': self.slug})
+
+    def save(self, *args, **kwargs):
+        # Счетчики меняются только UPDATE с F(): полное сохранение загруженного
+        # ранее курса (админка, скрипты) не должно затирать их старыми значениями
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
     def enrolled_students_count(self):
-        return self.enrollments.filter(status='ACTIVE').count()
+        return self.active_enrollments
 
     def available_slots(self):
-        return self.max_students - self.enrolled_students_count()
+        return max(self.max_students - self.active_enrollments, 0)
+
+    @classmethod
+    def shift_active_enrollments(cls, course_id, delta):
+        """
+        Атомарно изменяет счетчик активных записей на delta и увеличивает
+        версию записей курса одним UPDATE
+        """
+        # Не уходим в минус при рассинхронизации - ее исправляет команда recount
+        cls.objects.filter(pk=course_id).update(
+            active_enrollments=Greatest(F('active_enrollments') + delta, 0),
+            enrollments_version=F('enrollments_version') + 1
+        )
+
+    @classmethod
+    def bump_roster_versions(cls, student_ids):
+        """
+        Увеличивает версию записей курсов, где активно записаны студенты
+        student_ids: их имена в кэше списка записанных и ETag страницы курса устарели
+        """
+        cls.objects.filter(
+            pk__in=Enrollment.objects.filter(student_id__in=student_ids, status='ACTIVE').values('course_id')
+        ).update(enrollments_version=F('enrollments_version') + 1)
+
+
 class Enrollment(models.Model):
     STATUS_CHOICES = [
         ('ACTIVE', 'Активна'),
@@ -265,10 +417,31 @@ class Enrollment(models.Model):
         unique_together = ['student', 'course']
         ordering = ['-enrolled_at']
         db_table = 'enrollments'
+        indexes = [
+            models.Index(fields=['course', 'status'], name='enrollment_course_status_idx'),
+            models.Index(fields=['student', 'status'], name='enrollment_student_status_idx'),
+            # Активные записи курса в порядке по умолчанию (страница курса)
+            models.Index(
+                fields=['course', '-enrolled_at'],
+                condition=models.Q(status='ACTIVE'),
+                name='enrollment_active_course_idx'
+            ),
+            # Список записей в админке (ORDER BY enrolled_at DESC, id DESC) и date_hierarchy
+            models.Index(fields=['-enrolled_at', '-id'], name='enrollment_recent_idx'),
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._remember_state()
 
     def __str__(self):
         return f"{self.student} - {self.course}"
 
+    def _remember_state(self):
+        # Состояние на момент загрузки из БД - нужно для пересчета счетчиков курса
+        self._loaded_course_id = self.__dict__.get('course_id')
+        self._loaded_status = self.__dict__.get('status')
+
     def clean(self):
         if self.student and self.course:
             # Проверяем что студент не записан дважды на один курс
@@ -283,9 +456,58 @@ class Enrollment(models.Model):
         if self.course and not self.course.is_active:
             raise ValidationError('Нельзя записаться на неактивный курс')
 
+        # Проверяем что на курсе остались места (атомарно это делает services.enroll)
+        takes_seat = self.status == 'ACTIVE' and (
+            self._state.adding
+            or self._loaded_status != 'ACTIVE'
+            or self._loaded_course_id != self.course_id
+        )
+        if takes_seat and self.course.available_slots() <= 0:
+            raise ValidationError('На курсе нет свободных мест')
+
     def save(self, *args, **kwargs):
         self.clean()
         super().save(*args, **kwargs)
+
+
+@receiver(post_save, sender=Student)
+def invalidate_rosters_on_student_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Деактивация или возврат профиля меняет список записанных на его курсах
+    """
+    if not created and not raw and 'is_active' in instance.get_dirty_fields():
+        Course.bump_roster_versions([instance.pk])
+
+
+@receiver(post_save, sender=Enrollment)
+def update_course_counter_on_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Поддерживает Course.active_enrollments при создании записи и смене статуса или курса
+    """
+    if raw:
+        return
+    was_active = not created and instance._loaded_status == 'ACTIVE'
+    is_active = instance.status == 'ACTIVE'
+    old_course_id = None if created else instance._loaded_course_id
+
+    if old_course_id is not None and old_course_id != instance.course_id:
+        Course.shift_active_enrollments(old_course_id, -int(was_active))
+        Course.shift_active_enrollments(instance.course_id, int(is_active))
+    else:
+        Course.shift_active_enrollments(instance.course_id, int(is_active) - int(was_active))
+    Student.bump_enrollments_version(instance.student_id)
+    instance._remember_state()
+
+
+@receiver(post_delete, sender=Enrollment)
+def update_course_counter_on_delete(sender, instance, **kwargs):
+    """
+    Уменьшает счетчик курса при удалении активной записи
+    """
+    was_active = instance._loaded_status == 'ACTIVE'
+    Course.shift_active_enrollments(instance._loaded_course_id, -int(was_active))
+    Student.bump_enrollments_version(instance.student_id)
+
 # Сигнал для автоматического создания профиля при создании пользователя
 @receiver(post_save, sender=User)
 def create_student_profile(sender, instance, created, **kwargs):
@@ -298,7 +520,92 @@ def create_student_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_student_profile(sender, instance, **kwargs):
     """
-    Автоматически сохраняет профиль при сохранении пользователя
+    Автоматически сохраняет профиль при сохранении пользователя, если он был
+    загружен и изменен. Незагруженный профиль не читаем: изменений в нем нет
+    """
+    if not User.student_profile.related.is_cached(instance):
+        return
+    profile = User.student_profile.related.get_cached_value(instance)
+    if profile is not None and profile.get_dirty_fields():
+        profile.save()
+
+
+# Поля пользователя, от которых зависит список записанных на странице курса
+ROSTER_USER_FIELDS = ('first_name', 'last_name', 'is_active')
+
+
+def _roster_values(user):
+    # Отложенные (не загруженные) поля не читаем: их изменить не могли
+    return tuple(user.__dict__.get(name) for name in ROSTER_USER_FIELDS)
+
+
+@receiver(post_init, sender=User)
+def remember_roster_fields(sender, instance, **kwargs):
+    instance._loaded_roster_values = _roster_values(instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_rosters_on_user_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Переименование или деактивация пользователя меняет списки записанных
+    на курсах его профиля студента
+    """
+    values = _roster_values(instance)
+    if not created and not raw and values != instance._loaded_roster_values:
+        Course.bump_roster_versions(Student.objects.filter(user_id=instance.pk).values('pk'))
+    instance._loaded_roster_values = values
+
+
+def _instructor_name(instructor):
+    return tuple(instructor.__dict__.get(name) for name in ('first_name', 'last_name'))
+
+
+@receiver(post_init, sender=Instructor)
+def remember_instructor_name(sender, instance, **kwargs):
+    instance._loaded_name = _instructor_name(instance)
+
+
+@receiver(post_save, sender=Instructor)
+def touch_courses_on_instructor_rename(sender, instance, created, raw=False, **kwargs):
+    """
+    Имя преподавателя показано в каталоге: его курсы получают новый updated_at,
+    по которому считается ETag списка курсов
+    """
+    name = _instructor_name(instance)
+    if not created and not raw and name != instance._loaded_name:
+        Course.objects.filter(instructor=instance).update(updated_at=timezone.now())
+    instance._loaded_name = name
+
+
+@receiver(pre_delete, sender=Instructor)
+def touch_courses_on_instructor_delete(sender, instance, **kwargs):
+    # SET_NULL обнуляет instructor_id через update(), не трогая updated_at
+    Course.objects.filter(instructor=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Instructor)
+@receiver(post_delete, sender=Instructor)
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def invalidate_stats_cache(sender, **kwargs):
+    """
+    Сбрасывает кэш статистики главной страницы и панели администратора
+    """
+    bump_version_on_commit('stats')
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Instructor)
+@receiver(post_delete, sender=Instructor)
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def invalidate_catalog_cache(sender, **kwargs):
+    """
+    Сбрасывает закэшированные ответы API каталога курсов
     """
-    if hasattr(instance, 'student_profile'):
-        instance.student_profile.save()
+    bump_version_on_commit('catalog')
@@ -0,0 +1,242 @@
+"""
+Keyset-пагинация (по курсору) для ListView.
+
+Вместо OFFSET и COUNT(*) следующая страница выбирается условием
+"ключ сортировки больше последнего показанного", поэтому стоимость запроса
+не растет с номером страницы. Курсор передается в том же параметре ?page=,
+что и раньше, так что ссылки "назад/вперед" в шаблонах продолжают работать
+"""
+import base64
+import json
+import math
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+def _encode_cursor(values, direction, number):
+    payload = json.dumps({'k': values, 'd': direction, 'n': number}, default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction, number = data['k'], data['d'], int(data['n'])
+    except (ValueError, TypeError, KeyError):
+        raise Http404('Некорректный курсор страницы')
+    if direction not in ('n', 'p') or not isinstance(values, list) or number < 1:
+        raise Http404('Некорректный курсор страницы')
+    return values, direction, number
+
+
+def _rows_from_plan(plan):
+    return int(json.loads(plan)[0]['Plan']['Plan Rows'])
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк из плана запроса PostgreSQL; None на других СУБД
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    return _rows_from_plan(queryset.order_by().explain(format='json'))
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator для списков админки по большим таблицам: если планировщик
+    оценивает выборку больше чем в ADMIN_EXACT_COUNT_LIMIT строк, число
+    строк берется из плана вместо COUNT(*). Число страниц при этом
+    приблизительное, последние страницы могут оказаться пустыми
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate > settings.ADMIN_EXACT_COUNT_LIMIT:
+            return estimate
+        return super().count
+
+
+class KeysetPaginator:
+    """
+    Минимальный аналог django.core.paginator.Paginator для шаблонов
+    """
+
+    def __init__(self, per_page, count=None):
+        self.per_page = per_page
+        self.count = count
+
+    @property
+    def num_pages(self):
+        if self.count is None:
+            return None
+        return max(math.ceil(self.count / self.per_page), 1)
+
+
+class KeysetPage:
+    def __init__(self, object_list, number, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._next_cursor = next_cursor
+        self._previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._next_cursor is not None
+
+    def has_previous(self):
+        return self._previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def next_page_number(self):
+        return self._next_cursor
+
+    def previous_page_number(self):
+        return self._previous_cursor
+
+
+class KeysetPaginationMixin:
+    """
+    Подменяет OFFSET-пагинацию ListView на keyset-пагинацию.
+
+    keyset_ordering - поля сортировки (с '-' для убывания), последним должно
+    идти уникальное поле, например 'id'. estimate_total включает оценку общего
+    числа строк по статистике планировщика PostgreSQL вместо COUNT(*)
+    """
+    keyset_ordering = ('id',)
+    estimate_total = False
+
+    def _keyset_fields(self):
+        return [(name.lstrip('-'), name.startswith('-')) for name in self.keyset_ordering]
+
+    def _keyset_values(self, obj):
+        # Строки queryset.values() - словари с ключами по именам полей сортировки
+        if isinstance(obj, dict):
+            return [obj[name] for name, _ in self._keyset_fields()]
+        values = []
+        for name, _ in self._keyset_fields():
+            value = obj
+            for part in name.split('__'):
+                value = getattr(value, part)
+            values.append(value)
+        return values
+
+    def _keyset_filter(self, values, forward):
+        # (a, b, id) > (x, y, z) с учетом направления каждого поля:
+        # a >= x AND (a > x OR (a = x AND b > y) OR (a = x AND b = y AND id > z)).
+        # Отдельное условие a >= x дает планировщику диапазон по индексу
+        conditions = []
+        fields = self._keyset_fields()
+        for i, (name, descending) in enumerate(fields):
+            lookup = 'gt' if descending != forward else 'lt'
+            condition = Q(**{f'{name}__{lookup}': values[i]})
+            for j in range(i):
+                condition &= Q(**{fields[j][0]: values[j]})
+            conditions.append(condition)
+        first_name, first_descending = fields[0]
+        first_lookup = 'gte' if first_descending != forward else 'lte'
+        return Q(**{f'{first_name}__{first_lookup}': values[0]}) & reduce(or_, conditions)
+
+    def _keyset_order(self, forward):
+        order = []
+        for name, descending in self._keyset_fields():
+            order.append(f'-{name}' if descending == forward else name)
+        return order
+
+    def _parse_values(self, queryset, raw_values):
+        fields = self._keyset_fields()
+        if len(raw_values) != len(fields):
+            raise Http404('Некорректный курсор страницы')
+        values = []
+        for (name, _), raw in zip(fields, raw_values):
+            model = queryset.model
+            parts = name.split('__')
+            for part in parts[:-1]:
+                model = model._meta.get_field(part).related_model
+            field = model._meta.get_field(parts[-1])
+            try:
+                values.append(field.to_python(raw))
+            except Exception:
+                raise Http404('Некорректный курсор страницы')
+        return values
+
+    def estimate_count(self, queryset):
+        return estimate_count(queryset)
+
+    async def aestimate_count(self, queryset):
+        if connection.vendor != 'postgresql':
+            return None
+        return _rows_from_plan(await queryset.order_by().aexplain(format='json'))
+
+    def _page_queryset(self, queryset, page_size):
+        """
+        Запрос строк страницы (на одну больше page_size) и состояние курсора
+        """
+        token = self.request.GET.get(self.page_kwarg) or ''
+        if token.isdigit() or token == 'last':
+            # Старые ссылки и закладки с номером страницы (?page=2) ведут на первую страницу
+            token = ''
+        forward, number = True, 1
+        if token:
+            raw_values, direction, number = _decode_cursor(token)
+            forward = direction == 'n'
+            values = self._parse_values(queryset, raw_values)
+            queryset = queryset.filter(self._keyset_filter(values, forward))
+        page_queryset = queryset.order_by(*self._keyset_order(forward))[:page_size + 1]
+        return page_queryset, (bool(token), forward, number)
+
+    def _build_page(self, rows, page_size, cursor_state, count):
+        has_token, forward, number = cursor_state
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if not forward:
+            rows.reverse()
+
+        if forward:
+            has_next, has_previous = has_more, has_token
+        else:
+            has_next, has_previous = True, has_more
+            if not has_more:
+                number = 1
+
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = _encode_cursor(self._keyset_values(rows[-1]), 'n', number + 1)
+        if rows and has_previous:
+            previous_cursor = _encode_cursor(self._keyset_values(rows[0]), 'p', max(number - 1, 1))
+
+        paginator = KeysetPaginator(page_size, count)
+        page = KeysetPage(rows, number, paginator, next_cursor, previous_cursor)
+        return paginator, page, rows, page.has_other_pages()
+
+    def paginate_queryset(self, queryset, page_size):
+        page_queryset, cursor_state = self._page_queryset(queryset, page_size)
+        rows = list(page_queryset)
+        count = self.estimate_count(queryset) if self.estimate_total else None
+        return self._build_page(rows, page_size, cursor_state, count)
+
+    async def apaginate_queryset(self, queryset, page_size):
+        """
+        То же для асинхронных представлений, через async ORM
+        """
+        page_queryset, cursor_state = self._page_queryset(queryset, page_size)
+        rows = [obj async for obj in page_queryset]
+        count = await self.aestimate_count(queryset) if self.estimate_total else None
+        return self._build_page(rows, page_size, cursor_state, count)
@@ -0,0 +1,136 @@
+"""
+Чтение с реплик PostgreSQL с гарантией "вижу свои изменения".
+
+ReplicaRouter отправляет запись в default, а чтение в запросах пользователя -
+на случайную реплику из REPLICA_DATABASES. Запрос, который что-то записал,
+ставит cookie на REPLICA_PIN_SECONDS: пока она жива, все чтения этого
+пользователя идут в default и не зависят от отставания реплик.
+
+Вне веб-запросов (команды, фоновые потоки) и внутри transaction.atomic
+чтение всегда идет в default. Значения, которые кэшируются под версионированными
+ключами, тоже считаются по default (read_from_primary): иначе отстающая
+реплика записала бы старые данные под уже новой версией
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'fefu_primary'
+
+# Состояние текущего запроса: {'pinned': bool, 'wrote': bool}; None вне запросов
+replica_state = ContextVar('replica_state', default=None)
+
+
+def _in_transaction():
+    """
+    Открыт ли transaction.atomic в default. Транзакции самого TestCase
+    не считаются - так же, как это делает atomic(durable=True)
+    """
+    return any(not block._from_testcase for block in connections[DEFAULT_DB_ALIAS].atomic_blocks)
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Чтения внутри блока идут в default, запись закрепляет и внешний запрос
+    """
+    state = replica_state.get()
+    if state is None or state['pinned']:
+        yield
+        return
+    token = replica_state.set({'pinned': True, 'wrote': False})
+    try:
+        yield
+    finally:
+        inner = replica_state.get()
+        replica_state.reset(token)
+        if inner['wrote']:
+            state['wrote'] = state['pinned'] = True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = replica_state.get()
+        if state is None or state['pinned'] or not settings.REPLICA_DATABASES:
+            return DEFAULT_DB_ALIAS
+        if _in_transaction():
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.REPLICA_DATABASES)
+
+    def db_for_write(self, model, **hints):
+        state = replica_state.get()
+        if state is not None:
+            # Остаток запроса и следующие запросы пользователя читают из default
+            state['wrote'] = state['pinned'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что в default
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def _pinned_by_cookie(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaPinningMiddleware:
+    """
+    Ставится до SessionMiddleware, чтобы чтение сессии тоже учитывало закрепление
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            state = replica_state.get()
+            replica_state.reset(token)
+        return self._finish(response, state)
+
+    async def __acall__(self, request):
+        token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            state = replica_state.get()
+            replica_state.reset(token)
+        return self._finish(response, state)
+
+    @staticmethod
+    def _start(request):
+        # Небезопасные методы почти всегда пишут - проверки форм тоже читают из default
+        pinned = request.method not in ('GET', 'HEAD', 'OPTIONS') or _pinned_by_cookie(request)
+        return replica_state.set({'pinned': pinned, 'wrote': False})
+
+    @staticmethod
+    def _finish(response, state):
+        if state['wrote']:
+            response.set_cookie(
+                PIN_COOKIE,
+                str(time.time() + settings.REPLICA_PIN_SECONDS),
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
+        return response
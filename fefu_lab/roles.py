@@ -0,0 +1,88 @@
+"""
+Роли пользователей, закэшированные в сессии.
+
+При входе роль и признак активности профиля записываются в сессию,
+декораторы и dashboard_view читают их через request.role без запроса
+к таблице профилей. Вместе с ними хранится Student.updated_at: профиль
+загружается с пользователем (EmailBackend.get_user), и если он изменился,
+утверждения перечитываются. Метка хранится в БД, а не в кэше, поэтому
+одинакова во всех воркерах и не требует общего кэша
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+from django.contrib.auth.models import User
+from django.utils.functional import SimpleLazyObject
+
+SESSION_KEY = '_role_claims'
+
+
+def _profile_stamp(profile):
+    return profile.updated_at.isoformat() if profile else None
+
+
+def store_role_claims(request, user):
+    """
+    Читает профиль пользователя и сохраняет роль в сессии
+    """
+    profile = getattr(user, 'student_profile', None)
+    claims = {
+        'role': profile.role if profile else None,
+        'is_active': profile.is_active if profile else False,
+        'version': _profile_stamp(profile),
+        'loaded_at': int(time.time()),
+    }
+    request.session[SESSION_KEY] = claims
+    return claims
+
+
+def _claims_are_fresh(claims, user):
+    if time.time() - claims.get('loaded_at', 0) > settings.ROLE_CLAIMS_TTL:
+        return False
+    # Профиль, не загруженный вместе с пользователем, не читаем: хватает TTL
+    if not User.student_profile.related.is_cached(user):
+        return True
+    return claims.get('version') == _profile_stamp(getattr(user, 'student_profile', None))
+
+
+def get_role(request):
+    """
+    Роль текущего пользователя или None для анонимных и неактивных профилей
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return None
+
+    claims = request.session.get(SESSION_KEY)
+    if not claims or not _claims_are_fresh(claims, user):
+        claims = store_role_claims(request, user)
+
+    return claims['role'] if claims['is_active'] else None
+
+
+@receiver(user_logged_in)
+def set_role_claims_on_login(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, 'session'):
+        store_role_claims(request, user)
+
+
+class RoleMiddleware:
+    """
+    Добавляет ленивый request.role; ставится после AuthenticationMiddleware
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        # Роль вычисляется лениво, поэтому обработка одинакова для sync и async
+        request.role = SimpleLazyObject(lambda: get_role(request))
+        return self.get_response(request)
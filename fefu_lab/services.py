@@ -0,0 +1,136 @@
+"""
+Сервисные операции над записями на курсы
+"""
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
+
+from .caching import bump_version_on_commit
+from .models import Course, Enrollment, Student
+
+
+def enroll(student, course):
+    """
+    Записывает студента на курс с учетом Course.max_students.
+
+    Место резервируется одним условным UPDATE счетчика курса, поэтому
+    параллельные записи не могут переполнить курс. Дубликаты отсекает
+    ограничение unique_together, без предварительной проверки exists()
+    """
+    with transaction.atomic():
+        reserved = Course.objects.filter(
+            pk=course.pk,
+            is_active=True,
+            active_enrollments__lt=F('max_students')
+        ).update(
+            active_enrollments=F('active_enrollments') + 1,
+            enrollments_version=F('enrollments_version') + 1
+        )
+
+        if not reserved:
+            if not course.is_active:
+                raise ValidationError('Нельзя записаться на неактивный курс', code='inactive')
+            raise ValidationError('На курсе нет свободных мест', code='full')
+
+        enrollment = Enrollment(student=student, course=course, status='ACTIVE')
+        try:
+            # bulk_create не вызывает clean() и post_save: место уже учтено выше
+            with transaction.atomic():
+                Enrollment.objects.bulk_create([enrollment])
+        except IntegrityError:
+            # Запись уже есть - возвращаем отмененную или завершенную в активные
+            reactivated = Enrollment.objects.filter(
+                student=student,
+                course=course
+            ).exclude(status='ACTIVE').update(status='ACTIVE', completed_at=None)
+            if not reactivated:
+                raise ValidationError('Студент уже записан на этот курс', code='duplicate')
+            enrollment = Enrollment.objects.get(student=student, course=course)
+
+        Student.bump_enrollments_version(student.pk)
+        bump_version_on_commit('stats')
+        bump_version_on_commit('catalog')
+
+    return enrollment
+
+
+# Из каких статусов возможен переход в статус-ключ
+STATUS_TRANSITIONS = {
+    'COMPLETED': ['ACTIVE'],
+    'CANCELLED': ['ACTIVE'],
+    'ACTIVE': ['COMPLETED', 'CANCELLED'],
+}
+
+
+def active_enrollments_count():
+    """
+    Подзапрос: число активных записей курса OuterRef('pk')
+    """
+    return Coalesce(Subquery(
+        Enrollment.objects
+        .filter(course=OuterRef('pk'), status='ACTIVE')
+        .order_by()
+        .values('course')
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def sync_course_counters(course_ids):
+    """
+    Пересчитывает Course.active_enrollments по фактическим строкам и
+    увеличивает версию записей курсов - после массовых изменений в обход сигналов
+    """
+    Course.objects.filter(pk__in=course_ids).update(
+        active_enrollments=active_enrollments_count(),
+        enrollments_version=F('enrollments_version') + 1
+    )
+
+
+def change_status(enrollments, status):
+    """
+    Переводит записи queryset enrollments в статус status несколькими
+    UPDATE на весь набор, без save() и сигналов на каждую строку.
+
+    Переходят только записи из STATUS_TRANSITIONS[status]. Возврат в
+    активные, как и enroll, соблюдает max_students и активность курса:
+    места достаются записям в порядке enrolled_at. Курсы блокируются на
+    время операции, затем их счетчики пересчитываются, а версии записей
+    студентов и кэши статистики и каталога сбрасываются.
+    Возвращает (изменено записей, не хватило места)
+    """
+    with transaction.atomic():
+        targets = enrollments.filter(status__in=STATUS_TRANSITIONS[status]).order_by()
+        course_ids = sorted(set(targets.values_list('course_id', flat=True).distinct()))
+        if not course_ids:
+            return 0, 0
+        # Параллельные enroll() и сигналы ждут, пока счетчики не пересчитаны
+        list(Course.objects.select_for_update().filter(pk__in=course_ids).order_by('pk').values_list('pk'))
+
+        candidates = 0
+        if status == 'ACTIVE':
+            candidates = targets.count()
+            seat = Window(RowNumber(), partition_by=F('course_id'), order_by=[F('enrolled_at'), F('pk')])
+            targets = (
+                targets.filter(course__is_active=True)
+                .annotate(seat=seat)
+                .filter(seat__lte=F('course__max_students') - F('course__active_enrollments'))
+            )
+        selected = Enrollment.objects.filter(pk__in=targets.values('pk'))
+
+        # Версии студентов до смены статуса: после нее записи уже не попадают в targets
+        Student.objects.filter(pk__in=selected.values('student_id')).update(
+            enrollments_version=F('enrollments_version') + 1
+        )
+        changed = selected.update(
+            status=status,
+            completed_at=timezone.now() if status == 'COMPLETED' else None
+        )
+
+        sync_course_counters(course_ids)
+        bump_version_on_commit('stats')
+        bump_version_on_commit('catalog')
+
+    return changed, max(candidates - changed, 0)
@@ -0,0 +1,138 @@
+"""
+Сервис агрегированной статистики для главной страницы и панели администратора.
+Значения кэшируются под версионированными ключами, версию сбрасывают
+сигналы моделей Student, Course, Instructor и Enrollment
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .caching import aget_or_compute, aversioned_key, get_or_compute, versioned_key
+from .models import Student, Course, Instructor
+
+STATS_NAMESPACE = 'stats'
+
+
+def _student_totals():
+    return Student.objects.aggregate(
+        active=Count('pk', filter=Q(is_active=True)),
+        students=Count('pk', filter=Q(is_active=True, role='STUDENT')),
+        teachers=Count('pk', filter=Q(is_active=True, role='TEACHER')),
+    )
+
+
+def _course_totals():
+    return Course.objects.aggregate(
+        active=Count('pk', filter=Q(is_active=True)),
+        enrollments=Coalesce(Sum('active_enrollments'), 0),
+    )
+
+
+def _instructor_total():
+    return Instructor.objects.filter(is_active=True).count()
+
+
+def _merge_totals(students, courses, instructors):
+    return {
+        'active_students': students['active'],
+        'students': students['students'],
+        'teachers': students['teachers'],
+        'active_courses': courses['active'],
+        'active_enrollments': courses['enrollments'],
+        'active_instructors': instructors,
+    }
+
+
+def _compute_totals():
+    return _merge_totals(_student_totals(), _course_totals(), _instructor_total())
+
+
+def _in_own_thread(func):
+    """
+    Выполняет запрос в отдельном потоке с собственным соединением (из пула).
+    Методы async ORM (acount, aaggregate) одного запроса идут через один поток
+    и соединение по очереди, а так независимые запросы выполняются одновременно
+    """
+    def call():
+        try:
+            return func()
+        finally:
+            connections.close_all()
+
+    return sync_to_async(call, thread_sensitive=False)()
+
+
+async def _acompute_totals():
+    return _merge_totals(*await asyncio.gather(
+        _in_own_thread(_student_totals),
+        _in_own_thread(_course_totals),
+        _in_own_thread(_instructor_total),
+    ))
+
+
+def _recent_courses():
+    return Course.objects.filter(is_active=True).select_related('instructor').order_by('-created_at')[:3]
+
+
+def _compute_recent_courses():
+    return list(_recent_courses())
+
+
+async def _acompute_recent_courses():
+    return [course async for course in _recent_courses()]
+
+
+def get_totals():
+    return get_or_compute(versioned_key(STATS_NAMESPACE, 'totals'), _compute_totals)
+
+
+def get_home_stats():
+    """
+    Данные для главной страницы
+    """
+    totals = get_totals()
+    recent_courses = get_or_compute(
+        versioned_key(STATS_NAMESPACE, 'recent_courses'),
+        _compute_recent_courses
+    )
+    return {
+        'total_students': totals['active_students'],
+        'total_courses': totals['active_courses'],
+        'total_instructors': totals['active_instructors'],
+        'recent_courses': recent_courses,
+    }
+
+
+async def aget_home_stats():
+    """
+    Данные для главной страницы в асинхронном представлении
+    """
+    totals, recent_courses = await asyncio.gather(
+        aget_or_compute(await aversioned_key(STATS_NAMESPACE, 'totals'), _acompute_totals),
+        aget_or_compute(
+            await aversioned_key(STATS_NAMESPACE, 'recent_courses'),
+            _acompute_recent_courses
+        ),
+    )
+    return {
+        'total_students': totals['active_students'],
+        'total_courses': totals['active_courses'],
+        'total_instructors': totals['active_instructors'],
+        'recent_courses': recent_courses,
+    }
+
+
+def get_admin_stats():
+    """
+    Данные для панели администратора
+    """
+    totals = get_totals()
+    return {
+        'total_students': totals['students'],
+        'total_teachers': totals['teachers'],
+        'total_courses': totals['active_courses'],
+        'total_enrollments': totals['active_enrollments'],
+    }
@@ -0,0 +1,20 @@
+from django import template
+from django.conf import settings
+
+from ..avatars import avatar_urls
+
+register = template.Library()
+
+
+@register.inclusion_tag('fefu_lab/includes/avatar.html')
+def avatar(student, size='medium', css_class='avatar'):
+    """
+    Аватар студента нужного размера: {% avatar student 'small' %}
+    """
+    user = student.user
+    return {
+        'urls': avatar_urls(student, size),
+        'side': settings.AVATAR_THUMBNAIL_SIZES[size],
+        'css_class': css_class,
+        'initials': f'{user.first_name[:1]}{user.last_name[:1]}',
+    }
@@ -1,3 +1,1351 @@
-from django.test import TestCase
+import csv
+import importlib
+import json
+import shutil
+import tempfile
+from unittest import mock
+from datetime import timedelta
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.http import Http404, HttpResponse
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import async_views, stats
+from .avatars import thumbnail_name
+from .benchmarks import _queries_from_timing, compare_results
+from .caching import aget_or_compute, get_or_compute, get_version
+from .management.commands.import_enrollments import Command as ImportCommand
+from .models import Student, Course, Enrollment, Instructor
+from .admin import DateHierarchyQuerySet
+from .pagination import EstimatedCountPaginator
+from .replicas import PIN_COOKIE, ReplicaPinningMiddleware, ReplicaRouter
+from .services import change_status, enroll
+
+# Выборочный замер запросов (instrumentation) добавляет случайность в вывод
+# и число запросов, поэтому на время тестов он выключен независимо от
+# окружения и способа запуска; нужные тесты включают его через override_settings
+_no_sampling = override_settings(INSTRUMENTATION_SAMPLE_RATE=0)
+
+
+def setUpModule():
+    _no_sampling.enable()
+
+
+def tearDownModule():
+    _no_sampling.disable()
+
+
+def write_queries(context, table=None):
+    """
+    INSERT/UPDATE/DELETE из перехваченных запросов, при необходимости по одной таблице
+    """
+    writes = [
+        query['sql'] for query in context.captured_queries
+        if query['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))
+    ]
+    if table is not None:
+        writes = [sql for sql in writes if f'"{table}"' in sql.split('SET')[0]]
+    return writes
+
+
+class ProfileWriteTests(TestCase):
+    """
+    Вход и редактирование профиля не должны переписывать неизмененные строки
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='anna',
+            email='anna@fefu.ru',
+            password='secret-pass-123',
+            first_name='Анна',
+            last_name='Иванова'
+        )
+        cls.student_table = Student._meta.db_table
+
+    def test_login_does_not_write_student(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('login'), {
+                'username': 'anna@fefu.ru',
+                'password': 'secret-pass-123'
+            })
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(write_queries(context, self.student_table), [])
+        self.assertEqual(len(write_queries(context, 'auth_user')), 1)
+
+    def test_user_save_skips_unchanged_profile(self):
+        user = User.objects.select_related('student_profile').get(pk=self.user.pk)
+        with CaptureQueriesContext(connection) as context:
+            user.save(update_fields=['last_login'])
+
+        self.assertEqual(write_queries(context, self.student_table), [])
+
+    def test_profile_update_writes_only_changed_columns(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('profile'), {
+                'first_name': 'Анна',
+                'last_name': 'Иванова',
+                'email': 'anna@fefu.ru',
+                'faculty': 'SE',
+                'phone': '',
+                'bio': '',
+                'birth_date': '',
+            })
+
+        self.assertEqual(response.status_code, 302)
+        student_writes = write_queries(context, self.student_table)
+        self.assertEqual(len(student_writes), 1)
+        self.assertIn('"faculty"', student_writes[0])
+        self.assertNotIn('"bio"', student_writes[0])
+        self.assertEqual(write_queries(context, 'auth_user'), [])
+        self.assertEqual(Student.objects.get(user=self.user).faculty, 'SE')
+
+    def test_profile_update_of_user_fields(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as context:
+            self.client.post(reverse('profile'), {
+                'first_name': 'Аня',
+                'last_name': 'Иванова',
+                'email': 'anna@fefu.ru',
+                'faculty': 'CS',
+                'phone': '',
+                'bio': '',
+                'birth_date': '',
+            })
+
+        user_writes = write_queries(context, 'auth_user')
+        self.assertEqual(len(user_writes), 1)
+        self.assertIn('"first_name"', user_writes[0])
+        self.assertNotIn('"password"', user_writes[0])
+        self.assertEqual(write_queries(context, self.student_table), [])
+
+
+class LoginIndexMigrationTests(TestCase):
+    """
+    Миграция уникальных индексов логина останавливается на дубликатах без учета регистра
+    """
+
+    def test_duplicates_are_listed(self):
+        migration = importlib.import_module('fefu_lab.migrations.0004_user_lower_login_indexes')
+        migration.check_login_duplicates(apps, None)
+
+        # Данные до миграции: индексов еще нет
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX auth_user_username_lower_uniq')
+            cursor.execute('DROP INDEX auth_user_email_lower_uniq')
+        first = User.objects.create_user(username='Olga', email='olga@fefu.ru')
+        second = User.objects.create_user(username='olga', email='OLGA@fefu.ru')
+        User.objects.create_user(username='oleg')
+        User.objects.create_user(username='pavel')
+
+        with self.assertRaises(IntegrityError) as error:
+            migration.check_login_duplicates(apps, None)
+        lines = str(error.exception).splitlines()[1:]
+        self.assertEqual(lines, [
+            f"username 'olga': id={first.pk} 'Olga', id={second.pk} 'olga'",
+            f"email 'olga@fefu.ru': id={first.pk} 'olga@fefu.ru', id={second.pk} 'OLGA@fefu.ru'",
+        ])
+
+
+def explain(sql):
+    """
+    Строки плана выполнения запроса для текущей СУБД
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN {sql}')
+        else:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [str(row[-1]) for row in cursor.fetchall()]
+
+
+def full_scans(plan):
+    """
+    Шаги плана, читающие таблицу целиком без индекса
+    """
+    if connection.vendor == 'postgresql':
+        return [step for step in plan if 'Seq Scan' in step]
+    return [step for step in plan if step.startswith('SCAN ') and ' USING ' not in step]
+
+
+class QueryPlanTests(TestCase):
+    """
+    Регрессионные тесты планов: запросы страниц используют индексы,
+    а число запросов не зависит от объема данных
+    """
+
+    # Максимум запросов на повторный показ страницы (кэш статистики уже прогрет).
+    # На PostgreSQL списки дополнительно делают EXPLAIN для оценки числа страниц,
+    # каталог курсов - еще агрегат для ETag
+    budgets = {
+        'home': 0,
+        'student_list': 2,
+        'course_list': 3,
+        'course_detail': 1,
+        'student_profile': 1,
+        'student_dashboard': 3,
+        'teacher_dashboard': 3,
+        'admin_dashboard': 2,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_data',
+            students=300,
+            instructors=5,
+            courses=40,
+            enrollments=1500,
+            stdout=StringIO()
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.course = Course.objects.filter(is_active=True).first()
+        cls.student = Student.objects.filter(role='STUDENT').first()
+
+    def setUp(self):
+        cache.clear()
+        if connection.vendor == 'postgresql':
+            # На маленьких таблицах PostgreSQL предпочитает Seq Scan; запрещаем его,
+            # чтобы проверить, что для запроса вообще есть подходящий индекс
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def login(self, username):
+        self.client.force_login(User.objects.get(username=username))
+
+    def assert_view_uses_indexes(self, name, url):
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(context.captured_queries),
+            self.budgets[name],
+            f'{name}: превышен бюджет запросов'
+        )
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            scans = full_scans(explain(sql))
+            self.assertEqual(scans, [], f'{name}: полный просмотр таблицы в запросе\n{sql}')
+
+    def test_home(self):
+        self.assert_view_uses_indexes('home', reverse('home'))
+
+    def test_home_cold_cache(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('home'))
+        self.assertLessEqual(len(context.captured_queries), 4)
+
+    def test_student_list(self):
+        self.assert_view_uses_indexes('student_list', reverse('student_list'))
+
+    def test_student_list_deep_page(self):
+        response = self.client.get(reverse('student_list'))
+        for _ in range(5):
+            cursor = response.context['page_obj'].next_page_number()
+            response = self.client.get(reverse('student_list'), {'page': cursor})
+        self.assert_view_uses_indexes(
+            'student_list',
+            f"{reverse('student_list')}?page={response.context['page_obj'].next_page_number()}"
+        )
+
+    def test_legacy_page_number(self):
+        first = self.client.get(reverse('student_list'))
+        for page in ('2', 'last'):
+            response = self.client.get(reverse('student_list'), {'page': page})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(list(response.context['page_obj']), list(first.context['page_obj']))
+        self.assertEqual(self.client.get(reverse('student_list'), {'page': 'garbage'}).status_code, 404)
+
+    def test_student_list_walks_name_index(self):
+        # Порядок и условие курсора (фамилия, имя, user_id) обслуживает
+        # индекс auth_user_name_order_idx без отдельной сортировки
+        response = self.client.get(reverse('student_list'))
+        cursor = response.context['page_obj'].next_page_number()
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('student_list'), {'page': cursor})
+        sql = next(query['sql'] for query in context.captured_queries if 'ORDER BY' in query['sql'])
+        plan = '\n'.join(explain(sql))
+        self.assertIn('auth_user_name_order_idx', plan)
+        if connection.vendor == 'postgresql':
+            self.assertNotIn('Sort', plan)
+
+    def test_course_list(self):
+        self.assert_view_uses_indexes('course_list', reverse('course_list'))
+
+    def test_course_detail(self):
+        self.assert_view_uses_indexes('course_detail', self.course.get_absolute_url())
+
+    def test_student_profile(self):
+        self.assert_view_uses_indexes(
+            'student_profile',
+            reverse('student_profile', kwargs={'pk': self.student.pk})
+        )
+
+    def test_student_dashboard(self):
+        self.login('seed_student_0')
+        self.assert_view_uses_indexes('student_dashboard', reverse('student_dashboard'))
+
+    def test_teacher_dashboard(self):
+        self.login('seed_teacher_0')
+        self.assert_view_uses_indexes('teacher_dashboard', reverse('teacher_dashboard'))
+
+    def test_admin_dashboard(self):
+        self.login('seed_admin')
+        self.assert_view_uses_indexes('admin_dashboard', reverse('admin_dashboard'))
+
+
+class CourseCounterTests(TestCase):
+    """
+    Полное сохранение курса не затирает счетчики, измененные параллельно
+    """
+
+    def test_stale_save_keeps_counters(self):
+        course = Course.objects.create(
+            title='Счетчики',
+            slug='counters',
+            description='Курс для счетчиков',
+            duration=10,
+            max_students=5
+        )
+        stale = Course.objects.get(pk=course.pk)
+        enroll(User.objects.create_user(username='counter', password='secret-pass-123').student_profile, course)
+
+        stale.title = 'Счетчики и версии'
+        stale.save()
+
+        course.refresh_from_db()
+        self.assertEqual(course.title, 'Счетчики и версии')
+        self.assertEqual(course.active_enrollments, 1)
+        self.assertEqual(course.enrollments_version, 1)
+
+    def test_recount_refreshes_stats(self):
+        course = Course.objects.create(
+            title='Пересчет',
+            slug='recount',
+            description='Курс для пересчета',
+            duration=10,
+            max_students=5
+        )
+        enroll(User.objects.create_user(username='recount', password='secret-pass-123').student_profile, course)
+        Course.objects.filter(pk=course.pk).update(active_enrollments=4)
+        cache.clear()
+        self.assertEqual(stats.get_admin_stats()['total_enrollments'], 4)
+
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(stats.get_admin_stats()['total_enrollments'], 1)
+
+
+class SeedDataTests(TestCase):
+    """
+    seed_data дописывает данные без очистки, не повторяя имена пользователей
+    """
+
+    def seed(self):
+        call_command(
+            'seed_data',
+            students=3,
+            instructors=1,
+            courses=2,
+            enrollments=4,
+            no_clear=True,
+            stdout=StringIO()
+        )
+
+    def test_repeated_run_without_clear(self):
+        self.seed()
+        first_admin = User.objects.get(username='seed_admin')
+        self.seed()
+
+        seeded = User.objects.filter(username__startswith='seed_')
+        self.assertEqual(seeded.count(), 10)
+        second_base = first_admin.pk + 5
+        self.assertTrue(User.objects.filter(username=f'seed_{second_base}_student_2').exists())
+        self.assertEqual(Course.objects.count(), 4)
+        self.assertEqual(Enrollment.objects.count(), 8)
+        for course in Course.objects.all():
+            self.assertEqual(course.active_enrollments, course.enrollments.filter(status='ACTIVE').count())
+
+
+class FragmentCacheTests(TestCase):
+    """
+    Кэшированные карточки и список записанных обновляются после записи на курс
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = Course.objects.create(
+            title='Кэширование',
+            slug='caching',
+            description='Курс о кэшировании',
+            duration=10,
+            max_students=5
+        )
+        cls.user = User.objects.create_user(
+            username='boris',
+            password='secret-pass-123',
+            first_name='Борис',
+            last_name='Петров'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_enrollment_invalidates_fragments(self):
+        detail_url = self.course.get_absolute_url()
+        self.assertNotContains(self.client.get(detail_url), 'Борис Петров')
+        self.assertContains(self.client.get(reverse('course_list')), '0/5')
+
+        # Повторный показ: список записанных берется из кэша, остается только запрос курса
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(detail_url)
+        self.assertEqual(len(context.captured_queries), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            enroll(self.user.student_profile, self.course)
+
+        self.assertContains(self.client.get(detail_url), 'Борис Петров')
+        self.assertContains(self.client.get(reverse('course_list')), '1/5')
+
+    def test_rename_invalidates_roster(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enroll(self.user.student_profile, self.course)
+        detail_url = self.course.get_absolute_url()
+        etag = self.client.get(detail_url)['ETag']
+
+        user = User.objects.get(pk=self.user.pk)
+        user.last_name = 'Сидоров'
+        user.save()
+        response = self.client.get(detail_url)
+        self.assertContains(response, 'Борис Сидоров')
+        self.assertNotEqual(response['ETag'], etag)
+
+        student = Student.objects.get(user=self.user)
+        student.is_active = False
+        student.save()
+        self.assertNotEqual(self.client.get(detail_url)['ETag'], response['ETag'])
+
+
+class ConditionalGetTests(TestCase):
+    """
+    ETag публичных страниц меняется вместе с данными, а совпавший ETag дает 304
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = Course.objects.create(
+            title='Базы данных',
+            slug='databases',
+            description='Курс о базах данных',
+            duration=36,
+            max_students=10
+        )
+        cls.user = User.objects.create_user(
+            username='vera',
+            password='secret-pass-123',
+            first_name='Вера',
+            last_name='Смирнова'
+        )
+        cls.student = cls.user.student_profile
+
+    def setUp(self):
+        cache.clear()
+        self.urls = {
+            'course_list': reverse('course_list'),
+            'course_detail': self.course.get_absolute_url(),
+            'student_profile': reverse('student_profile', kwargs={'pk': self.student.pk}),
+        }
+
+    def etags(self):
+        return {name: self.client.get(url)['ETag'] for name, url in self.urls.items()}
+
+    def test_not_modified_skips_rendering(self):
+        for name, url in self.urls.items():
+            etag = self.client.get(url)['ETag']
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304, name)
+            self.assertEqual(response.content, b'', name)
+            self.assertLessEqual(len(context.captured_queries), 1, name)
+
+    def test_course_change_updates_etag(self):
+        before = self.etags()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.title = 'Базы данных и SQL'
+            self.course.save()
+        after = self.etags()
+
+        self.assertNotEqual(before['course_list'], after['course_list'])
+        self.assertNotEqual(before['course_detail'], after['course_detail'])
+
+    def test_instructor_rename_updates_etag(self):
+        instructor = Instructor.objects.create(
+            first_name='Олег', last_name='Попов', email='popov@fefu.ru', specialization='СУБД'
+        )
+        Course.objects.filter(pk=self.course.pk).update(instructor=instructor)
+        before = self.etags()
+        instructor.last_name = 'Попов-Ильин'
+        instructor.save()
+        after = self.etags()
+
+        self.assertNotEqual(before['course_list'], after['course_list'])
+        self.assertNotEqual(before['course_detail'], after['course_detail'])
+        instructor.delete()
+        self.assertNotEqual(after['course_list'], self.etags()['course_list'])
+
+    def test_enrollment_updates_etag(self):
+        before = self.etags()
+        with self.captureOnCommitCallbacks(execute=True):
+            enroll(self.student, self.course)
+        enrolled = self.etags()
+        for name in self.urls:
+            self.assertNotEqual(before[name], enrolled[name], name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollment = Enrollment.objects.get(student=self.student, course=self.course)
+            enrollment.status = 'CANCELLED'
+            enrollment.save()
+        cancelled = self.etags()
+        for name in self.urls:
+            self.assertNotEqual(enrolled[name], cancelled[name], name)
+
+    def test_etag_depends_on_viewer(self):
+        anonymous = self.etags()
+        self.client.force_login(self.user)
+        self.assertNotEqual(anonymous, self.etags())
+
+
+def image_upload(name='photo.png', size=(640, 480)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'teal').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class AvatarTests(TestCase):
+    """
+    Миниатюры аватара строятся после коммита, шаблоны ссылаются на них
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='gleb',
+            password='secret-pass-123',
+            first_name='Глеб',
+            last_name='Орлов'
+        )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, AVATAR_THUMBNAILS_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(self.user)
+
+    def upload(self, avatar):
+        return self.client.post(reverse('profile'), {
+            'first_name': 'Глеб',
+            'last_name': 'Орлов',
+            'email': '',
+            'faculty': 'CS',
+            'phone': '',
+            'bio': '',
+            'birth_date': '',
+            'avatar': avatar,
+        })
+
+    def test_upload_builds_thumbnails(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(image_upload())
+        self.assertEqual(response.status_code, 302)
+
+        student = Student.objects.get(user=self.user)
+        self.assertTrue(student.avatar_thumbnails_ready)
+        for size, side in settings.AVATAR_THUMBNAIL_SIZES.items():
+            for fmt in ('webp', 'jpeg'):
+                with default_storage.open(thumbnail_name(student.avatar.name, size, fmt)) as thumb:
+                    self.assertEqual(Image.open(thumb).size, (side, side))
+
+        page = self.client.get(reverse('student_profile', kwargs={'pk': student.pk}))
+        self.assertContains(page, thumbnail_name(student.avatar.name, 'medium', 'webp'))
+        self.assertNotContains(page, f'src="{student.avatar.url}"')
+
+    def test_replaced_avatar_drops_old_thumbnails(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload(image_upload('photo.png'))
+        old_name = Student.objects.get(user=self.user).avatar.name
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload(image_upload('photo.jpg'))
+        new_name = Student.objects.get(user=self.user).avatar.name
+
+        for size in settings.AVATAR_THUMBNAIL_SIZES:
+            for fmt in ('webp', 'jpeg'):
+                self.assertNotEqual(thumbnail_name(old_name, size, fmt), thumbnail_name(new_name, size, fmt))
+                self.assertFalse(default_storage.exists(thumbnail_name(old_name, size, fmt)))
+                self.assertTrue(default_storage.exists(thumbnail_name(new_name, size, fmt)))
+
+    def test_oversized_upload_is_rejected(self):
+        with self.settings(AVATAR_MAX_UPLOAD_SIZE=1024):
+            response = self.upload(image_upload(size=(800, 800)))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Student.objects.get(user=self.user).avatar)
+
+    def test_regenerate_avatars(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload(image_upload())
+        Student.objects.filter(user=self.user).update(avatar_thumbnails_ready=False)
+
+        call_command('regenerate_avatars', workers=1, stdout=StringIO())
+        self.assertTrue(Student.objects.get(user=self.user).avatar_thumbnails_ready)
+
+
+class AsyncViewTests(TestCase):
+    """
+    Асинхронные представления отдают ту же страницу и тот же ETag, что синхронные
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = Course.objects.create(
+            title='Асинхронность',
+            slug='async',
+            description='Курс об asyncio',
+            duration=12,
+            max_students=3
+        )
+        cls.user = User.objects.create_user(
+            username='dina',
+            password='secret-pass-123',
+            first_name='Дина',
+            last_name='Зайцева'
+        )
+        enroll(cls.user.student_profile, cls.course)
+
+    def setUp(self):
+        cache.clear()
+
+    async def get_async(self, view, url, **kwargs):
+        request = AsyncRequestFactory().get(url)
+        request.user = AnonymousUser()
+        response = await view(request, **kwargs)
+        if hasattr(response, 'render'):
+            await sync_to_async(response.render)()
+        return response
+
+    async def test_pages_match_sync_views(self):
+        pages = [
+            (async_views.CourseListView.as_view(), reverse('course_list'), {}, 'Асинхронность'),
+            (
+                async_views.CourseDetailView.as_view(), self.course.get_absolute_url(),
+                {'course_slug': 'async'}, 'Асинхронность'
+            ),
+            (
+                async_views.StudentDetailView.as_view(),
+                reverse('student_profile', kwargs={'pk': self.user.student_profile.pk}),
+                {'pk': self.user.student_profile.pk}, 'ДЗ'
+            ),
+        ]
+        for view, url, kwargs, text in pages:
+            expected = await sync_to_async(self.client.get)(url)
+            response = await self.get_async(view, url, **kwargs)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response['ETag'], expected['ETag'], url)
+            self.assertContains(response, text)
+
+    async def test_missing_object_is_404(self):
+        with self.assertRaises(Http404):
+            await self.get_async(async_views.CourseDetailView.as_view(), '/course/none/', course_slug='none')
+
+
+class AsyncHomeTests(TransactionTestCase):
+    """
+    Счетчики главной страницы выполняются в отдельных потоках, им нужны закоммиченные данные
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_home_counts(self):
+        await sync_to_async(Course.objects.create)(
+            title='Параллельные запросы', slug='parallel', description='', duration=6
+        )
+        await sync_to_async(User.objects.create_user)(username='egor', password='secret-pass-123')
+
+        request = AsyncRequestFactory().get('/')
+        request.user = AnonymousUser()
+        response = await async_views.home_page(request)
+        await sync_to_async(response.render)()
+
+        self.assertEqual(response.context_data['total_courses'], 1)
+        self.assertEqual(response.context_data['total_students'], 1)
+        self.assertContains(response, 'Параллельные запросы')
+
+
+class SessionTests(TestCase):
+    """
+    Сессии из кэша убирают обращения к django_session на обычных страницах
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='zoya', password='secret-pass-123')
+
+    def setUp(self):
+        cache.clear()
+
+    def session_queries(self, url):
+        self.client.force_login(self.user)
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in context.captured_queries if 'django_session' in query['sql']]
+
+    def test_cached_db_sessions_skip_session_table(self):
+        url = reverse('student_dashboard')
+        with self.settings(SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            self.assertGreater(len(self.session_queries(url)), 0)
+        self.client = self.client_class()
+        with self.settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db'):
+            self.assertEqual(self.session_queries(url), [])
+
+    def test_cleanup_sessions_in_batches(self):
+        now = timezone.now()
+        Session.objects.bulk_create(
+            [Session(session_key=f'expired{i}', session_data='', expire_date=now - timedelta(days=1)) for i in range(5)]
+            + [Session(session_key='alive', session_data='', expire_date=now + timedelta(days=1))]
+        )
+        with self.settings(SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            call_command('cleanup_sessions', batch_size=2, sleep=0, stdout=StringIO())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['alive'])
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+class RoleClaimsTests(TestCase):
+    """
+    Роли в сессии сверяются с профилем из БД, а не с версией в кэше процесса
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='rita', password='secret-pass-123')
+
+    def test_claims_survive_other_worker_cache(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('student_dashboard')).status_code, 200)
+
+        # Другой воркер: его локальный кэш пуст, но сессию переписывать не нужно
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(reverse('student_dashboard')).status_code, 200)
+        self.assertEqual(write_queries(context, Session._meta.db_table), [])
+
+    def test_role_change_refreshes_claims(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('admin_dashboard')).status_code, 302)
+
+        profile = Student.objects.get(user=self.user)
+        profile.role = 'ADMIN'
+        profile.save()
+        self.assertEqual(self.client.get(reverse('admin_dashboard')).status_code, 200)
+
+
+@override_settings(REPLICA_DATABASES=['replica1'])
+class ReplicaRoutingTests(TestCase):
+    """
+    Чтение уходит на реплику, пока пользователь ничего не записал
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='lev', password='secret-pass-123')
+
+    def read_alias(self, request, write=False):
+        """
+        База, выбранная роутером для чтения внутри запроса через middleware
+        """
+        seen = {}
+
+        def view(request):
+            if write:
+                ReplicaRouter().db_for_write(Course)
+            seen['alias'] = ReplicaRouter().db_for_read(Course)
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(view)(request)
+        return seen['alias'], response
+
+    def test_reads_go_to_replica(self):
+        alias, response = self.read_alias(RequestFactory().get('/courses/'))
+        self.assertEqual(alias, 'replica1')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_primary_outside_requests_and_transactions(self):
+        self.assertEqual(ReplicaRouter().db_for_read(Course), 'default')
+
+        def view(request):
+            with transaction.atomic():
+                alias = ReplicaRouter().db_for_read(Course)
+            return HttpResponse(alias)
+
+        response = ReplicaPinningMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(response.content, b'default')
+
+    def test_write_pins_to_primary(self):
+        alias, response = self.read_alias(RequestFactory().get('/'), write=True)
+        self.assertEqual(alias, 'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        request = RequestFactory().get('/courses/')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.assertEqual(self.read_alias(request)[0], 'default')
+
+    def test_cached_values_computed_on_primary(self):
+        def view(request):
+            computed = get_or_compute('replica-test', lambda: ReplicaRouter().db_for_read(Course))
+            return HttpResponse(f'{computed} {ReplicaRouter().db_for_read(Course)}')
+
+        cache.delete('replica-test')
+        response = ReplicaPinningMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(response.content, b'default replica1')
+
+    async def test_async_cached_values_computed_on_primary(self):
+        async def compute():
+            return ReplicaRouter().db_for_read(Course)
+
+        async def view(request):
+            computed = await aget_or_compute('replica-test-async', compute)
+            return HttpResponse(f'{computed} {ReplicaRouter().db_for_read(Course)}')
+
+        await cache.adelete('replica-test-async')
+        response = await ReplicaPinningMiddleware(view)(AsyncRequestFactory().get('/'))
+        self.assertEqual(response.content, b'default replica1')
+
+    def test_profile_post_pins_to_primary(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('profile'), {
+            'first_name': 'Лев',
+            'last_name': 'Петров',
+            'email': 'lev@fefu.ru',
+            'faculty': 'CS',
+            'phone': '',
+            'bio': '',
+            'birth_date': '',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+
+class ImportEnrollmentsTests(TestCase):
+    """
+    Массовый импорт соблюдает места и уникальность и поддерживает счетчики
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = Course.objects.create(
+            title='Импорт',
+            slug='import',
+            description='Курс для импорта',
+            duration=10,
+            max_students=2
+        )
+        cls.students = [
+            User.objects.create_user(username=f'import{i}', password='secret-pass-123').student_profile
+            for i in range(4)
+        ]
+        enroll(cls.students[0], cls.course)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def import_file(self, name, content):
+        path = f'{self.directory}/{name}'
+        with open(path, 'w', encoding='utf-8') as source:
+            source.write(content)
+        call_command('import_enrollments', path, batch_size=2, stdout=StringIO())
+        with open(f'{path}.rejected.csv', encoding='utf-8') as report:
+            return list(csv.DictReader(report))
+
+    def test_import_csv(self):
+        catalog_version = get_version('catalog')
+        rejected = self.import_file('cohort.csv', (
+            'student,course,status\n'
+            'import0,import,\n'
+            'import1,import,\n'
+            'import1,import,\n'
+            'import2,import,ACTIVE\n'
+            'import3,import,COMPLETED\n'
+            'nobody,import,\n'
+        ))
+
+        self.assertEqual(
+            [(row['line'], row['reason']) for row in rejected],
+            [
+                ('2', 'студент уже записан на курс'),
+                ('4', 'студент уже записан на курс'),
+                ('5', 'на курсе нет свободных мест'),
+                ('7', 'студент не найден'),
+            ]
+        )
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.active_enrollments, 2)
+        self.assertEqual(
+            dict(Enrollment.objects.filter(course=self.course).values_list('student__user__username', 'status')),
+            {'import0': 'ACTIVE', 'import1': 'ACTIVE', 'import3': 'COMPLETED'}
+        )
+        self.assertEqual(Student.objects.get(pk=self.students[1].pk).enrollments_version, 1)
+        self.assertNotEqual(get_version('catalog'), catalog_version)
+
+    def test_import_jsonl(self):
+        rejected = self.import_file('cohort.jsonl', (
+            '{"student": "import1", "course": "import"}\n'
+            '{"student": "import2", "course": "import"}\n'
+            '{"student": "import3", "course": "import"}\n'
+            'not json\n'
+        ))
+        self.assertEqual(
+            sorted((row['line'], row['reason']) for row in rejected),
+            [
+                ('2', 'на курсе нет свободных мест'),
+                ('3', 'на курсе нет свободных мест'),
+                ('4', 'некорректная строка JSON'),
+            ]
+        )
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.active_enrollments, 2)
+
+
+    def test_rows_written_concurrently_are_not_counted(self):
+        # Пара появляется после проверки существующих записей, как при записи из админки
+        insert = ImportCommand._insert
+
+        def racing_insert(command, rows):
+            Enrollment.objects.bulk_create([Enrollment(student=self.students[1], course=self.course)])
+            return insert(command, rows)
+
+        path = f'{self.directory}/race.csv'
+        with open(path, 'w', encoding='utf-8') as source:
+            source.write('student,course,status\nimport1,import,\nimport3,import,COMPLETED\n')
+        out = StringIO()
+        with mock.patch.object(ImportCommand, '_insert', racing_insert):
+            call_command('import_enrollments', path, stdout=out)
+
+        self.assertIn('Записано: 1 из 2 строк', out.getvalue())
+        self.assertIn('Пропущено строк, записанных параллельно: 1', out.getvalue())
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.active_enrollments, 2)
+
+
+class ExportTests(TestCase):
+    """
+    Выгрузки отдаются потоком и учитывают фильтры
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = Course.objects.create(
+            title='Выгрузки',
+            slug='exports',
+            description='Курс о выгрузках',
+            duration=10,
+            max_students=10
+        )
+        for username, faculty in (('vera', 'CS'), ('yan', 'SE')):
+            user = User.objects.create_user(username=username, password='secret-pass-123')
+            Student.objects.filter(user=user).update(faculty=faculty)
+            enroll(user.student_profile, cls.course)
+        cls.admin = User.objects.create_user(username='exporter', password='secret-pass-123')
+        cls.admin.student_profile.role = 'ADMIN'
+        cls.admin.student_profile.save()
+
+    def test_csv_export_is_streamed_and_filtered(self):
+        self.client.force_login(self.admin)
+        url = reverse('export', kwargs={'dataset': 'enrollments', 'fmt': 'csv'})
+        response = self.client.get(url, {'faculty': 'CS', 'status': 'ACTIVE', 'from': '2000-01-01'})
+
+        self.assertTrue(response.streaming)
+        with self.assertNumQueries(1):
+            rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:2], ['id', 'username'])
+        self.assertEqual([(row[1], row[5]) for row in rows[1:]], [('vera', 'exports')])
+
+        self.assertEqual(self.client.get(url, {'from': 'вчера'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'status': 'LOST'}).status_code, 400)
+
+    async def test_asgi_export_is_async_stream(self):
+        await self.async_client.aforce_login(self.admin)
+        url = reverse('export', kwargs={'dataset': 'enrollments', 'fmt': 'jsonl'})
+        response = await self.async_client.get(url)
+
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual(sorted(row['username'] for row in rows), ['vera', 'yan'])
+
+    def test_export_requires_admin(self):
+        self.client.force_login(User.objects.get(username='vera'))
+        response = self.client.get(reverse('export', kwargs={'dataset': 'students', 'fmt': 'csv'}))
+        self.assertEqual(response.status_code, 302)
+
+    def test_export_command_jsonl(self):
+        out = StringIO()
+        call_command('export_data', 'enrollments', format='jsonl', faculty='SE', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([(row['username'], row['course']) for row in rows], [('yan', 'exports')])
+
+
+class CatalogApiTests(TestCase):
+    """
+    Ответы API кэшируются целиком и обновляются вместе с версией каталога
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.courses = [
+            Course.objects.create(
+                title=f'API {i}',
+                slug=f'api-{i}',
+                description='Курс для API',
+                duration=10,
+                max_students=3
+            )
+            for i in range(3)
+        ]
+        cls.user = User.objects.create_user(username='mila', password='secret-pass-123')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeated_request_skips_orm(self):
+        url = reverse('api_seats')
+        self.assertEqual(self.client.get(url).json()['results'][0]['seats_left'], 3)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            enroll(self.user.student_profile, self.courses[2])
+        changed = self.client.get(url)
+        self.assertEqual(changed.json()['results'][0], {
+            'slug': 'api-2', 'max_students': 3, 'active_enrollments': 1, 'seats_left': 2
+        })
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_etag_survives_recompute(self):
+        # Истекший кэш или другой процесс с собственным кэшем дают тот же ETag
+        url = reverse('api_seats')
+        etag = self.client.get(url)['ETag']
+        cache.clear()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_sparse_fields_and_cursor(self):
+        url = reverse('api_courses')
+        first = self.client.get(url, {'fields': 'slug,seats_left', 'limit': 2}).json()
+        self.assertEqual(first['results'], [
+            {'slug': 'api-2', 'seats_left': 3},
+            {'slug': 'api-1', 'seats_left': 3},
+        ])
+        self.assertIsNone(first['previous'])
+
+        second = self.client.get(url, {'fields': 'slug', 'limit': 2, 'cursor': first['next']}).json()
+        self.assertEqual(second['results'], [{'slug': 'api-0'}])
+        self.assertIsNone(second['next'])
+
+        self.assertEqual(self.client.get(url, {'fields': 'slug,password'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'limit': 0}).status_code, 400)
+
+    def test_course_detail(self):
+        response = self.client.get(reverse('api_course_detail', kwargs={'slug': 'api-1'}))
+        self.assertEqual(response.json()['title'], 'API 1')
+        self.assertIsNone(response.json()['instructor_name'])
+        self.assertEqual(self.client.get(reverse('api_course_detail', kwargs={'slug': 'missing'})).status_code, 404)
+
+
+@override_settings(LOGIN_THROTTLE_IP=(3, 60), LOGIN_THROTTLE_ACCOUNT=(2, 300))
+class LoginThrottleTests(TestCase):
+    """
+    Лимит попыток входа срабатывает до поиска пользователя и хеширования
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='olga', password='secret-pass-123')
+
+    def setUp(self):
+        cache.clear()
+
+    def attempt(self, username, ip):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                reverse('login'),
+                {'username': username, 'password': 'wrong-pass'},
+                REMOTE_ADDR=ip
+            )
+        looked_up = any('auth_user' in query['sql'] for query in context.captured_queries)
+        return response, looked_up
+
+    def test_ip_bucket(self):
+        for n in range(3):
+            response, looked_up = self.attempt(f'user{n}', '198.51.100.1')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(looked_up)
+
+        response, looked_up = self.attempt('user9', '198.51.100.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertFalse(looked_up)
+        # Другой адрес не затронут
+        self.assertEqual(self.attempt('user9', '198.51.100.2')[0].status_code, 200)
+
+    def test_account_bucket_across_addresses(self):
+        self.attempt('OLGA', '198.51.100.1')
+        self.attempt('olga', '198.51.100.2')
+        response, looked_up = self.attempt('olga', '198.51.100.3')
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(looked_up)
+
+    def test_local_fallback_when_cache_fails(self):
+        with mock.patch('fefu_lab.throttling.cache.get', side_effect=ConnectionError):
+            statuses = [self.attempt(f'user{n}', '198.51.100.1')[0].status_code for n in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+
+    def test_registration_hashes_password_once(self):
+        with mock.patch.object(PBKDF2PasswordHasher, 'verify') as verify:
+            response = self.client.post(reverse('register'), {
+                'username': 'pavel',
+                'email': 'pavel@fefu.ru',
+                'first_name': 'Павел',
+                'last_name': 'Смирнов',
+                'faculty': 'CS',
+                'phone': '',
+                'bio': '',
+                'password1': 'Long-secret-pass-123',
+                'password2': 'Long-secret-pass-123',
+            })
+        self.assertRedirects(response, reverse('profile'))
+        verify.assert_not_called()
+        self.assertEqual(int(self.client.session['_auth_user_id']), User.objects.get(username='pavel').pk)
+
+
+class AdminChangelistTests(TestCase):
+    """
+    Списки админки: число запросов не зависит от числа строк, поиск по
+    пользователю и телефону, без COUNT(*) по большим таблицам
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser('root', 'root@fefu.ru', 'secret-pass-123')
+        for n, (last_name, phone) in enumerate([('Петров', '+79140000001'), ('Сидорова', '+79140000002')]):
+            user = User.objects.create_user(
+                username=f'admin-list-{n}',
+                email=f'list{n}@fefu.ru',
+                last_name=last_name,
+                password='secret-pass-123'
+            )
+            Student.objects.filter(user=user).update(phone=phone)
+
+    def setUp(self):
+        self.client.force_login(self.superuser)
+
+    def changelist(self, **params):
+        return self.client.get(reverse('admin:fefu_lab_student_changelist'), params)
+
+    def test_queries_do_not_grow_with_rows(self):
+        self.changelist()
+        with CaptureQueriesContext(connection) as before:
+            self.changelist()
+        for n in range(5):
+            User.objects.create_user(username=f'admin-extra-{n}', password='secret-pass-123')
+        with CaptureQueriesContext(connection) as after:
+            response = self.changelist()
+        self.assertEqual(len(response.context['cl'].result_list), 8)
+        self.assertEqual(len(after), len(before))
+
+    def test_search_by_user_fields_and_phone(self):
+        def found(term):
+            return sorted(student.user.username for student in self.changelist(q=term).context['cl'].result_list)
+
+        self.assertEqual(found('Петров'), ['admin-list-0'])
+        self.assertEqual(found('LIST1@'), ['admin-list-1'])
+        self.assertEqual(found('0000002'), ['admin-list-1'])
+        self.assertEqual(found('+7914 list0'), ['admin-list-0'])
+        self.assertEqual(found('"Сидорова Петров"'), [])
+
+    def test_estimated_count_replaces_count_query(self):
+        queryset = Student.objects.all()
+        with mock.patch('fefu_lab.pagination.estimate_count', return_value=50000):
+            with self.assertNumQueries(0):
+                self.assertEqual(EstimatedCountPaginator(queryset, 20).count, 50000)
+        with mock.patch('fefu_lab.pagination.estimate_count', return_value=10):
+            self.assertEqual(EstimatedCountPaginator(queryset, 20).count, queryset.count())
+
+    def test_change_form_uses_autocomplete(self):
+        student = Student.objects.get(user__username='admin-list-0')
+        response = self.client.get(reverse('admin:fefu_lab_student_change', args=[student.pk]))
+        self.assertContains(response, 'admin-autocomplete')
+        # В select только выбранный пользователь, а не вся таблица auth_user
+        self.assertNotContains(response, f'<option value="{self.superuser.pk}"')
+
+
+class BenchRoutesTests(TestCase):
+    def result(self, rps=100, p95=20.0, queries=3.0, errors=0, statuses=None):
+        return {
+            'rps': rps,
+            'p95_ms': p95,
+            'queries': queries,
+            'errors': errors,
+            'statuses': statuses or {200: rps},
+        }
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1, SERVER_TIMING_PUBLIC=True)
+    def test_queries_from_server_timing(self):
+        with self.assertLogs('fefu_lab.instrumentation'), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('course_list'))
+        self.assertEqual(_queries_from_timing(response['Server-Timing']), len(queries))
+        self.assertIsNone(_queries_from_timing(None))
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1)
+    def test_server_timing_only_for_staff(self):
+        with self.assertLogs('fefu_lab.instrumentation'):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('course_list')))
+        self.client.force_login(User.objects.create_user(username='staff', password='secret-pass-123', is_staff=True))
+        with self.assertLogs('fefu_lab.instrumentation'):
+            self.assertIn('Server-Timing', self.client.get(reverse('course_list')))
+
+    def test_compare_results(self):
+        # Эталон после json.load: коды ответа - строки
+        baseline = {'routes': {
+            'anonymous:home': self.result(statuses={'200': 100}),
+            'student:profile': self.result(),
+            'admin:export': self.result(),
+            'teacher:removed': self.result(),
+        }}
+        results = {'routes': {
+            # Колебания в пределах допуска
+            'anonymous:home': self.result(rps=85, p95=28.0),
+            'student:profile': self.result(rps=70, p95=40.0),
+            'admin:export': self.result(queries=4.0, statuses={200: 90, 500: 10}),
+        }}
+        regressions = compare_results(results, baseline, tolerance=0.2)
+        self.assertEqual([line.split(': ')[0] for line in regressions], [
+            'student:profile',
+            'student:profile',
+            'admin:export',
+            'admin:export',
+        ])
+
+
+class EnrollmentAdminTests(TestCase):
+    """
+    Массовая смена статуса записей: несколько UPDATE на весь набор,
+    места и счетчики курсов, версии кэшей студентов
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser('root', 'root@fefu.ru', 'secret-pass-123')
+        cls.course = Course.objects.create(
+            title='Статусы',
+            slug='statuses',
+            description='Курс для смены статусов',
+            duration=10,
+            max_students=3
+        )
+        cls.students = [
+            User.objects.create_user(username=f'status{i}', password='secret-pass-123').student_profile
+            for i in range(4)
+        ]
+        for student in cls.students[:3]:
+            enroll(student, cls.course)
+
+    def setUp(self):
+        self.client.force_login(self.superuser)
+
+    def run_action(self, action, enrollments):
+        return self.client.post(reverse('admin:fefu_lab_enrollment_changelist'), {
+            'action': action,
+            '_selected_action': [enrollment.pk for enrollment in enrollments],
+        })
+
+    def test_complete_action(self):
+        enrollments = list(Enrollment.objects.filter(course=self.course))
+        stats_version = get_version('stats')
+        course_version = Course.objects.get(pk=self.course.pk).enrollments_version
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.run_action('complete', enrollments[:2])
+        self.assertEqual(response.status_code, 302)
+
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.active_enrollments, 1)
+        self.assertEqual(self.course.enrollments_version, course_version + 1)
+        self.assertEqual(Enrollment.objects.filter(status='COMPLETED', completed_at__isnull=False).count(), 2)
+        self.assertEqual(Student.objects.get(pk=enrollments[0].student_id).enrollments_version, 2)
+        self.assertEqual(Student.objects.get(pk=enrollments[2].student_id).enrollments_version, 1)
+        self.assertNotEqual(get_version('stats'), stats_version)
+
+    def test_queries_do_not_grow_with_rows(self):
+        def queries(size):
+            Enrollment.objects.update(status='ACTIVE')
+            with CaptureQueriesContext(connection) as context:
+                change_status(Enrollment.objects.filter(pk__in=pks[:size]), 'CANCELLED')
+            return len(context)
+
+        pks = list(Enrollment.objects.values_list('pk', flat=True))
+        self.assertEqual(queries(1), queries(3))
+
+    def test_reactivate_respects_capacity(self):
+        change_status(Enrollment.objects.all(), 'CANCELLED')
+        enroll(self.students[3], self.course)
+        # Два места: возвращаются две самые ранние записи
+        self.assertEqual(change_status(Enrollment.objects.all(), 'ACTIVE'), (2, 1))
+        self.assertEqual(
+            set(Enrollment.objects.filter(status='ACTIVE').values_list('student', flat=True)),
+            {self.students[0].pk, self.students[1].pk, self.students[3].pk}
+        )
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.active_enrollments, 3)
+
+        Course.objects.filter(pk=self.course.pk).update(is_active=False)
+        change_status(Enrollment.objects.all(), 'CANCELLED')
+        self.assertEqual(change_status(Enrollment.objects.all(), 'ACTIVE'), (0, 4))
+
+    def test_date_hierarchy_matches_distinct(self):
+        Enrollment.objects.filter(student=self.students[0]).update(enrolled_at=timezone.now() - timedelta(days=400))
+        Enrollment.objects.filter(student=self.students[1]).update(enrolled_at=timezone.now() - timedelta(days=40))
+        queryset = DateHierarchyQuerySet(Enrollment)
+        for kind in ('year', 'month', 'day'):
+            self.assertEqual(
+                list(queryset.datetimes('enrolled_at', kind)),
+                list(Enrollment.objects.datetimes('enrolled_at', kind))
+            )
+        self.assertEqual(list(queryset.none().datetimes('enrolled_at', 'month')), [])
@@ -0,0 +1,87 @@
+"""
+Ограничение частоты попыток входа (token bucket) до проверки пароля.
+
+Каждая попытка забирает жетон из двух корзин: по IP клиента и по учетной
+записи (логину в нижнем регистре). Корзина емкостью capacity пополняется
+равномерно и заполняется целиком за period секунд. Пустая корзина означает
+отказ без хеширования пароля - PBKDF2 стоит сотни миллисекунд CPU воркера.
+
+Состояние корзин хранится в общем кэше, чтобы лимит был общим для воркеров
+(чтение и запись не атомарны, при гонке лимит может быть превышен на число
+одновременных запросов). Если кэш недоступен, используются корзины в памяти
+процесса: лимит становится на воркер, но защита не пропадает
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Запасные корзины процесса: ключ -> (жетоны, время обновления, срок хранения)
+LOCAL_BUCKETS_LIMIT = 10000
+_local_buckets = {}
+_local_lock = threading.Lock()
+
+
+def client_ip(request):
+    """
+    Адрес клиента: заголовок от nginx (CLIENT_IP_HEADER) или REMOTE_ADDR
+    """
+    header = settings.CLIENT_IP_HEADER
+    return (header and request.META.get(header)) or request.META.get('REMOTE_ADDR', '')
+
+
+def _take(state, now, capacity, period):
+    """
+    Забирает жетон: возвращает новое состояние (жетоны, время) и сколько
+    секунд ждать следующего жетона (0 - жетон выдан)
+    """
+    tokens, updated = state or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * capacity / period)
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+    return (tokens, now), (1 - tokens) * period / capacity
+
+
+def _take_local(key, now, capacity, period):
+    with _local_lock:
+        if len(_local_buckets) >= LOCAL_BUCKETS_LIMIT:
+            # Корзины, простоявшие дольше period, снова полные - их можно забыть
+            for stale in [k for k, (_, _, expires) in _local_buckets.items() if expires < now]:
+                del _local_buckets[stale]
+        entry = _local_buckets.get(key)
+        state, wait = _take(entry[:2] if entry else None, now, capacity, period)
+        _local_buckets[key] = (*state, now + period)
+    return wait
+
+
+def take_token(name, capacity, period):
+    """
+    Жетон из корзины name; возвращает 0 или секунды до следующей попытки
+    """
+    key = f'fefu:throttle:{name}'
+    now = time.time()
+    try:
+        state, wait = _take(cache.get(key), now, capacity, period)
+        # Через period без попыток корзина полна - ключ можно не хранить
+        cache.set(key, state, period)
+        return wait
+    except Exception:
+        logger.warning('Кэш недоступен, ограничение входа по корзинам процесса', exc_info=True)
+        return _take_local(key, now, capacity, period)
+
+
+def throttle_login(request, login):
+    """
+    Проверяет корзины IP и учетной записи перед проверкой пароля.
+    Возвращает 0, если попытку можно выполнить, иначе секунды ожидания
+    """
+    wait = take_token(f'login-ip:{client_ip(request)}', *settings.LOGIN_THROTTLE_IP)
+    if wait:
+        return wait
+    account = hashlib.md5(login.encode()).hexdigest()
+    return take_token(f'login-account:{account}', *settings.LOGIN_THROTTLE_ACCOUNT)
@@ -1,16 +1,22 @@
 from django.urls import path
-from . import views
+from . import api, views
 from django.conf import settings
 from django.conf.urls.static import static
 
+# Под ASGI публичные страницы обслуживают асинхронные представления
+if settings.ASYNC_VIEWS:
+    from . import async_views as read_views
+else:
+    read_views = views
+
 urlpatterns = [
     # Основные страницы
-    path('', views.home_page, name='home'),
+    path('', read_views.home_page, name='home'),
     path('about/', views.about_page, name='about'),
     path('students/', views.StudentListView.as_view(), name='student_list'),
-    path('student/<int:pk>/', views.StudentDetailView.as_view(), name='student_profile'),  # Это правильное имя!
-    path('courses/', views.CourseListView.as_view(), name='course_list'),
-    path('course/<slug:course_slug>/', views.CourseDetailView.as_view(), name='course_detail'),
+    path('student/<int:pk>/', read_views.StudentDetailView.as_view(), name='student_profile'),  # Это правильное имя!
+    path('courses/', read_views.CourseListView.as_view(), name='course_list'),
+    path('course/<slug:course_slug>/', read_views.CourseDetailView.as_view(), name='course_detail'),
     path('feedback/', views.feedback_view, name='feedback'),
     
     # Аутентификация
@@ -24,6 +30,15 @@ urlpatterns = [
     path('dashboard/student/', views.student_dashboard, name='student_dashboard'),
     path('dashboard/teacher/', views.teacher_dashboard, name='teacher_dashboard'),
     path('dashboard/admin/', views.admin_dashboard, name='admin_dashboard'),
+
+    # JSON API каталога (только чтение, ответы кэшируются под версией каталога)
+    path('api/courses/', api.CourseListApiView.as_view(), name='api_courses'),
+    path('api/courses/<slug:slug>/', api.CourseDetailApiView.as_view(), name='api_course_detail'),
+    path('api/seats/', api.SeatsApiView.as_view(), name='api_seats'),
+    path('api/instructors/', api.InstructorListApiView.as_view(), name='api_instructors'),
+
+    # Потоковая выгрузка: /export/enrollments.csv?faculty=CS&status=ACTIVE&from=2025-09-01
+    path('export/<str:dataset>.<str:fmt>', views.export_view, name='export'),
 ]
 
 if settings.DEBUG:
@@ -1,39 +1,54 @@
-from django.shortcuts import render, get_object_or_404
-from django.http import Http404
+import math
+from functools import wraps
+
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
 from django.views.generic import View, DetailView, ListView
 from django.contrib.auth import login, logout, authenticate
-from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.auth.models import User
 from django.contrib import messages
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.shortcuts import redirect
 
-from .models import Student, Course, Instructor, Enrollment
+from . import exports, stats
+from .conditional import ConditionalGetMixin, ConditionalObjectMixin
+from .models import Student, Course, Enrollment
+from .pagination import KeysetPaginationMixin
 from .forms import FeedbackForm, RegistrationForm, UserRegistrationForm, UserLoginForm, UserProfileForm, StudentProfileForm
 
 # СУЩЕСТВУЮЩИЕ ПРЕДСТАВЛЕНИЯ (ОБНОВЛЕННЫЕ)
 def home_page(request):
-    total_students = Student.objects.filter(is_active=True).count()
-    total_courses = Course.objects.filter(is_active=True).count()
-    total_instructors = Instructor.objects.filter(is_active=True).count()
-    recent_courses = Course.objects.filter(is_active=True).select_related('instructor').order_by('-created_at')[:3]
-    
-    return render(request, 'fefu_lab/home.html', {
+    return TemplateResponse(request, 'fefu_lab/home.html', {
         'title': 'Главная страница',
-        'total_students': total_students,
-        'total_courses': total_courses,
-        'total_instructors': total_instructors,
-        'recent_courses': recent_courses
+        **stats.get_home_stats()
     })
 
 def about_page(request):
-    return render(request, 'fefu_lab/about.html', {
+    return TemplateResponse(request, 'fefu_lab/about.html', {
         'title': 'О нас'
     })
 
-class StudentDetailView(DetailView):
+class StudentDetailView(ConditionalObjectMixin, DetailView):
     model = Student
     template_name = 'fefu_lab/student_profile.html'
     context_object_name = 'student'
+
+    def get_queryset(self):
+        return Student.objects.select_related('user')
+
+    def get_object_etag(self, student):
+        # Имя пользователя нужно для инициалов на месте аватара
+        user = student.user
+        return (
+            student.pk, student.updated_at, student.enrollments_version,
+            user.first_name, user.last_name
+        )
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -43,33 +58,44 @@ class StudentDetailView(DetailView):
         ).select_related('course')
         return context
     
-class CourseDetailView(DetailView):
+class CourseDetailView(ConditionalObjectMixin, DetailView):
     model = Course
     template_name = 'fefu_lab/course_detail.html'
     context_object_name = 'course'
     slug_field = 'slug'
     slug_url_kwarg = 'course_slug'
-    
+    roster_limit = 50
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('instructor')
+
+    def get_object_etag(self, course):
+        instructor = course.instructor.full_name if course.instructor else ''
+        return (course.pk, course.updated_at, course.enrollments_version, instructor)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        # Ленивый queryset: при попадании в кэш фрагмента списка запрос не выполняется
         context['enrollments'] = Enrollment.objects.filter(
             course=self.object, 
             status='ACTIVE'
-        ).select_related('student')
+        ).select_related('student__user').order_by('-enrolled_at')[:self.roster_limit]
+        context['enrolled_count'] = self.object.active_enrollments
+        context['available_slots'] = self.object.available_slots()
         return context
 
 def feedback_view(request):
     if request.method == 'POST':
         form = FeedbackForm(request.POST)
         if form.is_valid():
-            return render(request, 'fefu_lab/success.html', {
+            return TemplateResponse(request, 'fefu_lab/success.html', {
                 'message': 'Ваше сообщение успешно отправлено!',
                 'title': 'Обратная связь'
             })
     else:
         form = FeedbackForm()
     
-    return render(request, 'fefu_lab/feedback.html', {
+    return TemplateResponse(request, 'fefu_lab/feedback.html', {
         'form': form,
         'title': 'Обратная связь'
     })
@@ -78,94 +104,109 @@ def old_register_view(request):
     if request.method == 'POST':
         form = RegistrationForm(request.POST)
         if form.is_valid():
-            return render(request, 'fefu_lab/success.html', {
+            return TemplateResponse(request, 'fefu_lab/success.html', {
                 'message': f'Пользователь успешно зарегистрирован!',
                 'title': 'Регистрация'
             })
     else:
         form = RegistrationForm()
     
-    return render(request, 'fefu_lab/register.html', {
+    return TemplateResponse(request, 'fefu_lab/register.html', {
         'form': form,
         'title': 'Регистрация'
     })
 
-class StudentListView(ListView):
+class StudentListView(KeysetPaginationMixin, ListView):
     model = Student
     template_name = 'fefu_lab/student_list.html'
     context_object_name = 'students'
     paginate_by = 10
+    keyset_ordering = ('user__last_name', 'user__first_name', 'user_id')
+    estimate_total = True
     
     def get_queryset(self):
-        return Student.objects.filter(is_active=True).select_related('user')
+        # Число записей считаем подзапросом по индексу, а не запросом на каждую карточку
+        enrollments_count = Subquery(
+            Enrollment.objects.filter(student=OuterRef('pk'))
+            .order_by()
+            .values('student')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return Student.objects.filter(is_active=True).select_related('user').annotate(
+            enrollments_count=Coalesce(enrollments_count, 0)
+        )
 
-class CourseListView(ListView):
+class CourseListView(ConditionalGetMixin, KeysetPaginationMixin, ListView):
     model = Course
     template_name = 'fefu_lab/course_list.html'
     context_object_name = 'courses'
     paginate_by = 9
+    keyset_ordering = ('-created_at', 'id')
+    estimate_total = True
     
     def get_queryset(self):
         return Course.objects.filter(is_active=True).select_related('instructor')
 
-# Декораторы для проверки ролей
-def student_required(function=None):
-    actual_decorator = user_passes_test(
-        lambda u: hasattr(u, 'student_profile') and u.student_profile.role in ['STUDENT', 'ADMIN'],
-        login_url='/login/'
-    )
+    # Состояние каталога одним агрегатом по БД: добавление и снятие курса
+    # меняют число, правка курса (и переименование преподавателя) - updated_at,
+    # записи - сумму enrollments_version
+    etag_aggregates = {
+        'courses': Count('*'),
+        'updated_at': Max('updated_at'),
+        'enrollments_version': Sum('enrollments_version'),
+    }
+
+    def get_etag_queryset(self):
+        return Course.objects.filter(is_active=True).order_by()
+
+    def get_etag(self):
+        state = self.get_etag_queryset().aggregate(**self.etag_aggregates)
+        return tuple(state.values())
+
+# Декораторы для проверки ролей (роль берется из сессии через request.role)
+def role_required(roles, function=None):
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.role in roles:
+                return view_func(request, *args, **kwargs)
+            return redirect_to_login(request.get_full_path(), '/login/')
+        return _wrapped_view
     if function:
-        return actual_decorator(function)
-    return actual_decorator
+        return decorator(function)
+    return decorator
+
+def student_required(function=None):
+    return role_required(['STUDENT', 'ADMIN'], function)
 
 def teacher_required(function=None):
-    actual_decorator = user_passes_test(
-        lambda u: hasattr(u, 'student_profile') and u.student_profile.role in ['TEACHER', 'ADMIN'],
-        login_url='/login/'
-    )
-    if function:
-        return actual_decorator(function)
-    return actual_decorator
+    return role_required(['TEACHER', 'ADMIN'], function)
 
 def admin_required(function=None):
-    actual_decorator = user_passes_test(
-        lambda u: hasattr(u, 'student_profile') and u.student_profile.role == 'ADMIN',
-        login_url='/login/'
-    )
-    if function:
-        return actual_decorator(function)
-    return actual_decorator
+    return role_required(['ADMIN'], function)
 
 def register_view(request):
     if request.method == 'POST':
         form = UserRegistrationForm(request.POST)
         if form.is_valid():
             user = form.save()
-            
-            authenticated_user = authenticate(
-                request,
-                username=form.cleaned_data['username'],
-                password=form.cleaned_data['password1']
-            )
-            
-            if authenticated_user is not None:
-                login(request, authenticated_user)
-                messages.success(request, f'Регистрация прошла успешно! Добро пожаловать, {user.first_name}!')
-                return redirect('profile')
-            else:
-                messages.success(request, f'Регистрация прошла успешно! Добро пожаловать, {user.first_name}!')
-                messages.info(request, 'Пожалуйста, войдите в систему со своими учетными данными.')
-                return redirect('login')
-                
+            # Пароль только что захеширован при сохранении: входим без
+            # authenticate(), который посчитал бы PBKDF2 второй раз
+            login(request, user, backend='fefu_lab.backends.EmailBackend')
+            messages.success(request, f'Регистрация прошла успешно! Добро пожаловать, {user.first_name}!')
+            return redirect('profile')
+
     else:
         form = UserRegistrationForm()
     
-    return render(request, 'fefu_lab/registration/register.html', {
+    return TemplateResponse(request, 'fefu_lab/registration/register.html', {
         'form': form,
         'title': 'Регистрация'
     })
 
 def login_view(request):
+    retry_after = 0
     if request.method == 'POST':
         form = UserLoginForm(request.POST)
         if form.is_valid():
@@ -178,15 +219,24 @@ def login_view(request):
                 messages.success(request, f'Добро пожаловать, {user.first_name}!')
                 next_url = request.GET.get('next', 'profile')
                 return redirect(next_url)
+
+            # EmailBackend отказал по лимиту попыток, пароль не проверялся
+            retry_after = math.ceil(getattr(request, 'login_retry_after', 0))
+            if retry_after:
+                messages.error(request, f'Слишком много попыток входа. Повторите через {retry_after} с')
             else:
                 messages.error(request, 'Неверный email или пароль')
     else:
         form = UserLoginForm()
     
-    return render(request, 'fefu_lab/registration/login.html', {
+    response = TemplateResponse(request, 'fefu_lab/registration/login.html', {
         'form': form,
         'title': 'Вход в систему'
     })
+    if retry_after:
+        response.status_code = 429
+        response['Retry-After'] = str(retry_after)
+    return response
 
 def logout_view(request):
     logout(request)
@@ -204,15 +254,19 @@ def profile_view(request):
         )
         
         if user_form.is_valid() and profile_form.is_valid():
-            user_form.save()
-            profile_form.save()
+            with transaction.atomic():
+                # Профиль пишет только измененные колонки (Student.save)
+                profile_form.save()
+                if user_form.has_changed():
+                    user = user_form.save(commit=False)
+                    user.save(update_fields=user_form.changed_data)
             messages.success(request, 'Профиль успешно обновлен')
             return redirect('profile')
     else:
         user_form = UserProfileForm(instance=request.user)
         profile_form = StudentProfileForm(instance=request.user.student_profile)
     
-    return render(request, 'fefu_lab/registration/profile.html', {
+    return TemplateResponse(request, 'fefu_lab/registration/profile.html', {
         'user_form': user_form,
         'profile_form': profile_form,
         'title': 'Мой профиль'
@@ -223,9 +277,12 @@ def profile_view(request):
 @student_required
 def student_dashboard(request):
     student = request.user.student_profile
-    enrollments = Enrollment.objects.filter(student=student, status='ACTIVE').select_related('course')
+    enrollments = Enrollment.objects.filter(
+        student=student,
+        status='ACTIVE'
+    ).select_related('course__instructor')
     
-    return render(request, 'fefu_lab/dashboard/student_dashboard.html', {
+    return TemplateResponse(request, 'fefu_lab/dashboard/student_dashboard.html', {
         'student': student,
         'enrollments': enrollments,
         'title': 'Личный кабинет студента'
@@ -235,52 +292,76 @@ def student_dashboard(request):
 @teacher_required
 def teacher_dashboard(request):
     """
-    Личный кабинет преподавателя - ИСПРАВЛЕННАЯ ВЕРСИЯ
+    Личный кабинет преподавателя: курсы связанного с пользователем Instructor
     """
     teacher_profile = request.user.student_profile
     
-    # Ищем курсы, где преподаватель - это любой активный Instructor
-    # Для тестирования берем первый попавшийся курс
-    courses = Course.objects.filter(is_active=True)[:2]  # Временно показываем любые 2 курса
+    # Количество студентов считается в том же запросе, что и список курсов
+    courses = Course.objects.filter(
+        instructor__user=request.user,
+        is_active=True
+    ).annotate(
+        students_count=Count('enrollments', filter=Q(enrollments__status='ACTIVE'))
+    ).order_by('title')
     
-    # Статистика по курсам
     course_stats = []
     for course in courses:
-        enrollments_count = Enrollment.objects.filter(course=course, status='ACTIVE').count()
         course_stats.append({
             'course': course,
-            'students_count': enrollments_count,
-            'available_seats': course.available_slots()
+            'students_count': course.students_count,
+            'available_seats': max(course.max_students - course.students_count, 0)
         })
     
-    return render(request, 'fefu_lab/dashboard/teacher_dashboard.html', {
+    return TemplateResponse(request, 'fefu_lab/dashboard/teacher_dashboard.html', {
         'teacher': teacher_profile,
         'course_stats': course_stats,
+        'total_students': sum(stat['students_count'] for stat in course_stats),
         'title': 'Личный кабинет преподавателя'
     })
 
 @login_required
 @admin_required
 def admin_dashboard(request):
-    stats = {
-        'total_students': Student.objects.filter(role='STUDENT', is_active=True).count(),
-        'total_teachers': Student.objects.filter(role='TEACHER', is_active=True).count(),
-        'total_courses': Course.objects.filter(is_active=True).count(),
-        'total_enrollments': Enrollment.objects.filter(status='ACTIVE').count(),
-    }
-    
-    return render(request, 'fefu_lab/dashboard/admin_dashboard.html', {
-        'stats': stats,
+    return TemplateResponse(request, 'fefu_lab/dashboard/admin_dashboard.html', {
+        'stats': stats.get_admin_stats(),
         'title': 'Панель администратора'
     })
 
+@login_required
+@admin_required
+def export_view(request, dataset, fmt):
+    if dataset not in exports.DATASETS or fmt not in exports.FORMATS:
+        raise Http404('Неизвестная выгрузка')
+    try:
+        queryset = exports.export_queryset(
+            dataset,
+            faculty=request.GET.get('faculty'),
+            status=request.GET.get('status'),
+            date_from=request.GET.get('from'),
+            date_to=request.GET.get('to')
+        )
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+
+    # Базу выбираем сейчас: строки читаются уже после выхода из middleware
+    queryset = queryset.using(queryset.db)
+    chunks = exports.export_chunks(exports.export_lines(dataset, queryset, fmt))
+    if isinstance(request, ASGIRequest):
+        # Под ASGI нужен асинхронный итератор, иначе Django прочитает выгрузку целиком
+        chunks = exports.aexport_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=exports.FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    # nginx отдает поток клиенту сразу, не собирая его во временный файл
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
 def dashboard_view(request):
-    profile = request.user.student_profile
+    role = request.role
     
-    if profile.role == 'ADMIN':
+    if role == 'ADMIN':
         return redirect('admin_dashboard')
-    elif profile.role == 'TEACHER':
+    elif role == 'TEACHER':
         return redirect('teacher_dashboard')
     else:
         return redirect('student_dashboard')
\ No newline at end of file
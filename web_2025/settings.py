@@ -33,6 +33,8 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    # Классы операторов в индексах (триграммы для поиска админки)
+    'django.contrib.postgres',
     'fefu_lab',
 ]
 
@@ -43,10 +45,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'fefu_lab.instrumentation.QueryInstrumentationMiddleware',
+    'fefu_lab.replicas.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'fefu_lab.roles.RoleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -54,6 +59,10 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'web_2025.urls'
 
+# Асинхронные представления каталога и профилей (fefu_lab/async_views.py),
+# включаются вместе с развертыванием под uvicorn
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
 
 # ======================
 # TEMPLATES (обязательно для admin)
@@ -91,6 +100,207 @@ DATABASES = {
     }
 }
 
+# Воркеры и потоки gunicorn (те же переменные читает deploy/gunicorn/config.py)
+GUNICORN_WORKERS = int(os.getenv('GUNICORN_WORKERS', '3'))
+GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS', '2'))
+GUNICORN_WORKER_CLASS = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+
+# Под uvicorn синхронный код запросов (ORM) выполняется в пуле потоков
+# asgiref размером ASGI_THREADS, он и ограничивает число соединений процесса
+if GUNICORN_WORKER_CLASS.startswith('uvicorn'):
+    REQUEST_THREADS = int(os.getenv('ASGI_THREADS', '4'))
+else:
+    REQUEST_THREADS = GUNICORN_THREADS
+
+# Пул соединений psycopg внутри каждого процесса. Поток держит не больше
+# одного соединения, плюс фоновые потоки миниатюр аватаров, поэтому всего
+# к PostgreSQL открыто не больше GUNICORN_WORKERS * DB_POOL_MAX_SIZE соединений
+DB_POOL = os.getenv('DB_POOL', 'True') == 'True'
+DB_POOL_MAX_SIZE = int(os.getenv(
+    'DB_POOL_MAX_SIZE',
+    str(REQUEST_THREADS + int(os.getenv('AVATAR_WORKERS', '2')))
+))
+
+if DB_POOL:
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '1')),
+            'max_size': DB_POOL_MAX_SIZE,
+            # Сколько ждать свободное соединение, прежде чем вернуть ошибку
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+            # Простаивающие соединения закрываются, соединения пересоздаются раз в max_lifetime
+            'max_idle': 300,
+            'max_lifetime': 1800,
+        },
+    }
+else:
+    # Без пула соединение живет между запросами потока до DB_CONN_MAX_AGE секунд
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+
+# Проверка соединения перед использованием (после рестарта PostgreSQL и т.п.);
+# для пула Django передает ее как check в ConnectionPool
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+
+# ======================
+# READ REPLICAS
+# ======================
+
+# Реплики PostgreSQL только для чтения: DB_REPLICA_HOSTS=host1,host2:5433.
+# Остальные параметры (база, пользователь, пул) берутся из default.
+# В тестах реплики смотрят в тестовую базу default (MIRROR)
+REPLICA_DATABASES = []
+for number, address in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1):
+    host, _, port = address.strip().partition(':')
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['fefu_lab.replicas.ReplicaRouter']
+
+# Сколько секунд после записи пользователь читает только из default,
+# должно быть больше обычного отставания реплик
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '10'))
+
+
+# ======================
+# AUTH
+# ======================
+
+# Вход по email или логину без учета регистра
+AUTHENTICATION_BACKENDS = [
+    'fefu_lab.backends.EmailBackend',
+]
+
+# Лимит попыток входа до проверки пароля (fefu_lab/throttling.py):
+# (емкость корзины, за сколько секунд она восстанавливается полностью)
+LOGIN_THROTTLE_IP = (int(os.getenv('LOGIN_THROTTLE_IP_ATTEMPTS', '20')), 60)
+LOGIN_THROTTLE_ACCOUNT = (int(os.getenv('LOGIN_THROTTLE_ACCOUNT_ATTEMPTS', '10')), 300)
+
+# Адрес клиента от nginx (proxy_set_header X-Real-IP); пустая строка - REMOTE_ADDR,
+# если gunicorn доступен напрямую и заголовку нельзя доверять
+CLIENT_IP_HEADER = os.getenv('CLIENT_IP_HEADER', 'HTTP_X_REAL_IP')
+
+
+# Сколько секунд роль из сессии считается действительной без перепроверки
+ROLE_CLAIMS_TTL = int(os.getenv('ROLE_CLAIMS_TTL', '900'))
+
+
+# ======================
+# CACHE
+# ======================
+
+# Общий кэш нужен, чтобы сброс версии в одном воркере gunicorn
+# был виден остальным; без REDIS_URL каждый процесс кэширует сам
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Время жизни кэша статистики (сек.), ограничивает устаревание при локальном кэше
+STATS_CACHE_TIMEOUT = int(os.getenv('STATS_CACHE_TIMEOUT', '300'))
+
+# Время жизни фрагментов шаблонов (сек.). Ключ фрагмента включает версию
+# данных, поэтому срок ограничивает только занимаемую память
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv('FRAGMENT_CACHE_TIMEOUT', '3600'))
+
+# JSON API каталога: время жизни закэшированных ответов (сек.) и размер страницы
+CATALOG_API_CACHE_TIMEOUT = int(os.getenv('CATALOG_API_CACHE_TIMEOUT', '300'))
+CATALOG_API_PAGE_SIZE = 20
+CATALOG_API_MAX_PAGE_SIZE = 100
+
+# Списки админки по большим таблицам: выше этой оценки планировщика
+# число строк не пересчитывается COUNT(*) (EstimatedCountPaginator)
+ADMIN_EXACT_COUNT_LIMIT = int(os.getenv('ADMIN_EXACT_COUNT_LIMIT', '10000'))
+
+
+# ======================
+# SESSIONS & MESSAGES
+# ======================
+
+# db             - каждый запрос читает django_session (по умолчанию без REDIS_URL)
+# cached_db      - чтение из кэша, запись в кэш и в БД (по умолчанию с REDIS_URL)
+# cache          - только кэш: без Redis сессии теряются при рестарте
+# signed_cookies - данные в подписанной cookie, без хранилища на сервере;
+#                  выход не отзывает уже выданную cookie
+SESSION_MODE = os.getenv('SESSION_MODE', 'cached_db' if REDIS_URL else 'db')
+# Без Redis кэш у каждого воркера свой: выход удалил бы сессию из кэша одного
+# воркера, а на остальных старая cookie действовала бы до истечения записи.
+# Поэтому режимы с кэшем без общего хранилища заменяются на db
+if SESSION_MODE in ('cached_db', 'cache') and not REDIS_URL:
+    SESSION_MODE = 'db'
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_MODE]
+
+# Сообщения в cookie не пишут в сессию; fallback переходит на сессию,
+# только если сообщения не помещаются в cookie
+MESSAGE_STORAGE = {
+    'cookie': 'django.contrib.messages.storage.cookie.CookieStorage',
+    'fallback': 'django.contrib.messages.storage.fallback.FallbackStorage',
+    'session': 'django.contrib.messages.storage.session.SessionStorage',
+}[os.getenv('MESSAGE_STORAGE', 'cookie')]
+
+# Размер пакета удаления просроченных сессий (команда cleanup_sessions)
+SESSION_CLEANUP_BATCH_SIZE = int(os.getenv('SESSION_CLEANUP_BATCH_SIZE', '5000'))
+
+
+# ======================
+# EXPORTS
+# ======================
+
+# Строк в одной порции серверного курсора при потоковой выгрузке
+# (/export/..., команда export_data); от него зависит память воркера
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+
+
+# ======================
+# INSTRUMENTATION & LOGGING
+# ======================
+
+# Доля запросов, для которых считаются SQL-запросы, время БД и рендеринга.
+# Тесты fefu_lab выключают замер сами (override_settings в setUpModule)
+INSTRUMENTATION_SAMPLE_RATE = float(os.getenv('INSTRUMENTATION_SAMPLE_RATE', '0.1'))
+# Заголовок Server-Timing раскрывает число и время SQL-запросов, поэтому по
+# умолчанию отдается только персоналу (is_staff); True - всем клиентам (замеры)
+SERVER_TIMING_PUBLIC = os.getenv('SERVER_TIMING_PUBLIC', 'False') == 'True'
+# Сколько одинаковых SQL-шаблонов за запрос считать признаком N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', '5'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'fefu_lab': {
+            'handlers': ['console'],
+            'level': os.getenv('FEFU_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
 
 
 # ======================
@@ -103,6 +313,20 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Загрузки всегда пишутся во временный файл по частям, а не в память
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
+FILE_UPLOAD_TEMP_DIR = os.getenv('FILE_UPLOAD_TEMP_DIR') or None
+
+# Аватары: ограничение размера загрузки и размеры миниатюр (сторона квадрата, px)
+AVATAR_MAX_UPLOAD_SIZE = int(os.getenv('AVATAR_MAX_UPLOAD_SIZE', str(5 * 1024 * 1024)))
+AVATAR_THUMBNAIL_SIZES = {
+    'small': 64,
+    'medium': 200,
+}
+# Миниатюры строятся в фоновых потоках процесса; False - сразу после коммита
+AVATAR_THUMBNAILS_ASYNC = os.getenv('AVATAR_THUMBNAILS_ASYNC', 'True') == 'True'
+AVATAR_WORKERS = int(os.getenv('AVATAR_WORKERS', '2'))
+
 
 # ======================
 # DEFAULTS